@@ -5,13 +5,17 @@ import json
 from typing import Dict
 
 from gestion_acces import GestionAcces
-from verification import identifier_carte
 from affichage_qapass import AffichageQapass
 from rfid_lecteur import LecteurRFID
 from card_manager import CardService
 from cartes_autorisees import GestionCartesCSV
+from cartes_sqlite import GestionCartesSQLite
+from balayeur_expiration import BalayeurExpiration
+from service_cartes import ClientServiceCartes
+from uid_carte import normaliser_uid
 from journal_rfid import JournalRFID
 from mqtt_publisher import MqttPublisher
+from sequence_scans import SequenceScans
 from admin_interface import AdminInterface
 from feedback import FeedbackGPIO
 
@@ -28,10 +32,20 @@ class RFIDController:
         port=8883,
         sujet_log="LecteurRFID/logs",
         fichier_cartes="cartes_autorisees.csv",
+        stockage_cartes="csv",
+        socket_service_cartes=None,
+        intervalle_balayage=3600,
+        id_lecteur=None,
+        rotation_historique="quotidienne",
+        retention_historique_jours=365,
         utiliser_mqtt=True,
         mqtt_username=None,
         mqtt_certfile=None,
         mqtt_keyfile=None,
+        taille_lot_mqtt=20,
+        delai_lot_mqtt_ms=250,
+        encodage_mqtt="json",
+        fichier_sequence="sequence_scans.json",
     ):
         self.rfid = RFID(pin_irq=None)
         self.feedback = FeedbackGPIO(
@@ -47,7 +61,10 @@ class RFIDController:
         self.delai_lecture = delai_lecture
         self.nom_fichier = nom_fichier
         self.fichier_cartes = fichier_cartes
-        self.gestion_csv = GestionCartesCSV(nom_fichier=self.fichier_cartes)
+        self.gestion_csv = self._creer_gestion_cartes(stockage_cartes, socket_service_cartes)
+        # Desactivation des cartes expirees hors du chemin de scan
+        self.balayeur = BalayeurExpiration(self.gestion_csv, intervalle=intervalle_balayage)
+        self.balayeur.demarrer()
         self.mifare = LecteurRFID(rdr=self.rfid)
         self.card_service = CardService(self.mifare)
         self.questions_admin = self._charger_questions_admin("pass.json")
@@ -62,7 +79,13 @@ class RFIDController:
         self.mqtt_certfile = mqtt_certfile
         self.mqtt_keyfile = mqtt_keyfile
 
-        self.journal = JournalRFID(nom_fichier=self.nom_fichier)
+        self.journal = JournalRFID(
+            nom_fichier=self.nom_fichier,
+            id_lecteur=id_lecteur,
+            rotation=rotation_historique,
+            retention_jours=retention_historique_jours,
+        )
+        self.sequence = SequenceScans(fichier_sequence)
         self.mqtt_publisher = MqttPublisher(
             utiliser_mqtt=self.utiliser_mqtt,
             broker=self.broker,
@@ -71,6 +94,9 @@ class RFIDController:
             mqtt_username=self.mqtt_username,
             mqtt_certfile=self.mqtt_certfile,
             mqtt_keyfile=self.mqtt_keyfile,
+            taille_lot=taille_lot_mqtt,
+            delai_lot_ms=delai_lot_mqtt_ms,
+            encodage=encodage_mqtt,
         )
         self.admin_interface = AdminInterface(
             gestion_csv=self.gestion_csv,
@@ -81,17 +107,54 @@ class RFIDController:
 
         print("Lecteur RFID pret. Approchez une carte !")
 
+    def _creer_gestion_cartes(self, stockage_cartes: str, socket_service_cartes=None):
+        if socket_service_cartes:
+            # Table partagee par plusieurs lecteurs via service_cartes.py
+            return ClientServiceCartes(chemin_socket=socket_service_cartes)
+        if stockage_cartes == "sqlite":
+            fichier_csv = self.fichier_cartes
+            fichier_db = os.path.splitext(fichier_csv)[0] + ".db"
+            gestion = GestionCartesSQLite(nom_fichier=fichier_db)
+            # Migration unique depuis le CSV existant lors du premier demarrage en SQLite
+            if gestion.est_vide() and fichier_csv.endswith(".csv") and os.path.exists(fichier_csv):
+                gestion.migrer_depuis_csv(fichier_csv)
+            return gestion
+        return GestionCartesCSV(nom_fichier=self.fichier_cartes)
+
     def afficher_carte(self, uid: list[int]):
         print("\n####### Nouvelle carte detectee #######")
         print(f"UID  : {uid}")
         print("****************************************")
 
-    def _verifier_carte(self, uid: list[int]):
-        est_autorisee, nom, message, _, _ = self.gestion_csv.verifier_carte(uid)
-        if est_autorisee:
-            return True, nom, "Accepte"
-        else:
-            return False, nom, message
+    def _verifier_carte(self, uid):
+        # Decision unique du scan, reutilisee par le feedback, le journal et MQTT
+        return self.gestion_csv.evaluer_carte(uid)
+
+    @staticmethod
+    def _credits_en_entier(valeur):
+        # decision.credits est la cellule CSV brute ("5" ou "") : entier ou None, jamais un melange
+        try:
+            return int(valeur)
+        except (TypeError, ValueError):
+            return None
+
+    def _journaliser(self, date, uid, decision, debut_scan, credits_apres=None):
+        # Evenement complet : raison, credits avant/apres et latence depuis la detection de la carte.
+        # Un seul evenement par decision : le meme est ecrit dans l'historique et publie sur MQTT,
+        # numerote (lecteur, sequence) pour le dedoublonnage cote consommateur
+        credits_avant = self._credits_en_entier(decision.credits)
+        credits_apres = credits_avant if credits_apres is None else self._credits_en_entier(credits_apres)
+        evenement = self.journal.enregistrer(
+            date,
+            uid,
+            decision.nom,
+            decision.statut,
+            raison=decision.code_raison,
+            credits_avant=credits_avant,
+            credits_apres=credits_apres,
+            latence_ms=(time.perf_counter() - debut_scan) * 1000,
+        )
+        self.mqtt_publisher.publish(evenement, self.sequence.suivant())
 
     def attendre_carte(self, message="Approchez une carte..."):
         if message:
@@ -145,21 +208,21 @@ class RFIDController:
 
                     uid_carte = self.attendre_carte(message=None)
 
+                    debut_scan = time.perf_counter()
                     temps_actuel = time.time()
-                    uid_string = "-".join(str(octet) for octet in uid_carte)
-                    est_autorisee, nom, statut = self._verifier_carte(uid_string)
+                    # UID canonique : forme texte calculee une fois, cle de l'index et de l'anti-double-scan
+                    uid = normaliser_uid(uid_carte)
+                    decision = self._verifier_carte(uid)
+                    nom = decision.nom
                     date = time.strftime("%Y-%m-%d %H:%M:%S")
 
-                    # MQTT
-                    self.mqtt_publisher.publish(date, uid_carte)
-
-                    self.afficher_carte(uid_carte)
+                    self.afficher_carte(uid)
                     print(f"Nom: {nom}")
-                    print(f"Statut: {statut}")
+                    print(f"Statut: {decision.statut}")
 
                     # Anti-double-scan protection
                     temps_ecoule = temps_actuel - self.dernier_temps
-                    if uid_string == self.derniere_carte:
+                    if uid == self.derniere_carte:
                         if temps_ecoule < 5:
                             print("Carte deja lue et debitee. Attendre 5 secondes pour une nouvelle lecture.")
                             time.sleep(0.5)
@@ -170,48 +233,45 @@ class RFIDController:
                             continue
 
                     print("\n===== Carte detectee =====")
-                    print("UID :", uid_carte)
+                    print("UID :", uid)
 
-                    # --- Verification ---
-                    carte_ok, nom_utilisateur = identifier_carte(uid_carte)
-                    if carte_ok:
-                        self.acces.carte_acceptee(nom=nom_utilisateur)
+                    # --- Feedback ---
+                    if decision.autorise:
+                        self.acces.carte_acceptee(nom=nom)
                     else:
-                        self.acces.carte_refusee()
+                        self.acces.carte_refusee(motif=decision.motif_ecran)
 
-                    if not est_autorisee:
-                        print(f"Carte non autorisée : {uid_string}")
+                    if not decision.autorise:
+                        print(f"Carte non autorisée : {uid} ({decision.raison})")
                         # Log blocked access
-                        self.mqtt_publisher.publish(date, uid_carte)
-                        self.journal.enregistrer(date, uid_carte, nom, statut)
+                        self._journaliser(date, uid, decision, debut_scan)
                     else:
                         # --- ADMIN CARD ---
                         if nom.lower() == "admin":
-                            admin_ok = self.admin_interface.autoriser_admin(uid_string)
+                            admin_ok = self.admin_interface.autoriser_admin(uid)
 
                             if admin_ok:
                                 # Log admin access before opening menu
-                                self.mqtt_publisher.publish(date, uid_carte)
-                                self.journal.enregistrer(date, uid_carte, nom, statut)
+                                self._journaliser(date, uid, decision, debut_scan)
 
                                 self.admin_interface.run(uid_carte)
 
                         # --- NORMAL CARD : decrement credits ---    
                         else:
+                            nouveaux_credits = None
                             try:
                                 succes_decrementation, nouveaux_credits = self.simulateActionCost(uid_carte, 1)
 
                                 if succes_decrementation : 
-                                    self.gestion_csv.mettre_a_jour_credits(uid_string, nouveaux_credits)
-                                #self.gestion_csv.decrementer_un_credit(uid_string)
+                                    self.gestion_csv.mettre_a_jour_credits(uid, nouveaux_credits)
+                                #self.gestion_csv.decrementer_un_credit(uid)
                             except Exception as err:
                                 print(f"[ERREUR ECRITURE CREDITS] {err}")
                             finally:
                                 # Log normal card access regardless of success/failure
-                                self.mqtt_publisher.publish(date, uid_carte)
-                                self.journal.enregistrer(date, uid_carte, nom, statut)
+                                self._journaliser(date, uid, decision, debut_scan, credits_apres=nouveaux_credits)
 
-                    self.derniere_carte = uid_string
+                    self.derniere_carte = uid
                     self.dernier_temps = temps_actuel
 
                 except Exception as loop_error:
@@ -219,10 +279,20 @@ class RFIDController:
                     print(f"[ERREUR NON-GEREE] {loop_error}")
                     time.sleep(0.5)  # small delay for stability
         finally:
-            # Cleanup
-            self.feedback.cleanup()
-            self.rfid.cleanup()
-
-            self.mqtt_publisher.close()
+            # Cleanup : le journal d'abord (les dernieres lignes encore en file sont la trace
+            # durable), puis chaque etape isolee pour qu'un echec n'empeche pas les suivantes
+            etapes = (
+                ("journal", self.journal.fermer),
+                ("feedback", self.feedback.cleanup),
+                ("lecteur RFID", self.rfid.cleanup),
+                ("MQTT", self.mqtt_publisher.close),
+                ("balayeur", self.balayeur.arreter),
+                ("cartes", self.gestion_csv.fermer),
+            )
+            for nom, etape in etapes:
+                try:
+                    etape()
+                except Exception as e:
+                    print(f"[ERREUR] Nettoyage {nom} : {e}")
 
             print(" Nettoyage termine.")
@@ -1,6 +1,10 @@
+import argparse
 import ssl
+import sys
 import time
 import os
+from collections import OrderedDict
+
 import paho.mqtt.client as mqtt
 
 BROKER = "broker-mqtt.canadaeast-1.ts.eventgrid.azure.net"
@@ -12,55 +16,151 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CERTFILE = os.path.join(BASE_DIR, "..", "certs", "client-subscriber.pem")
 KEYFILE  = os.path.join(BASE_DIR, "..", "certs", "client-subscriber.key")
 
-TOPIC = "LecteurRFID/logs/#"
-
-
-def on_connect(client, userdata, flags, rc): # Removed properties=None
-    print(f"[CONNECT] RC={rc}")
-    if rc == 0:
-        print("✓ Subscriber connecté")
-        # Subscribing now works because the Client Attribute is correctly set
-        client.subscribe(TOPIC, qos=1)
-        print(f"→ Souscription à {TOPIC}")
-    else:
-        print(f"✗ Échec connexion subscriber (RC={rc})")
-
-
-def on_message(client, userdata, msg):
-    print(f"📬 [MESSAGE] {msg.topic} → {msg.payload.decode()}")
-
+# Décodeur partagé avec le publieur (JSON, binaire, binaire compressé)
+sys.path.insert(0, os.path.join(BASE_DIR, ".."))
+from encodage_mqtt import decoder_charge
 
-client = mqtt.Client(
-    client_id="python-subscriber-test",
-    protocol=mqtt.MQTTv311
-)
-
-
-client.on_connect = on_connect
-client.on_message = on_message
-
-client.tls_set(
-    ca_certs=None,
-    certfile=CERTFILE,
-    keyfile=KEYFILE,
-    cert_reqs=ssl.CERT_REQUIRED,
-    tls_version=ssl.PROTOCOL_TLSv1_2
-)
-
-client.username_pw_set(username=USERNAME, password=None)
-
-print("Connexion…")
-client.connect(BROKER, PORT)
-client.loop_start()
-
-print("En attente de messages (Ctrl+C pour quitter)…")
+TOPIC = "LecteurRFID/logs/#"
 
-try:
-    while True:
-        time.sleep(1)
-except KeyboardInterrupt:
-    print("Arrêt demandé.")
 
-client.loop_stop()
-client.disconnect()
-print("Déconnexion subscriber.")
\ No newline at end of file
+class FenetreDedoublonnage:
+    """Mémoire des clés (lecteur, sequence) déjà traitées, bornée en nombre et en durée.
+
+    Le publieur livre au moins une fois : après une coupure, il renvoie les événements non
+    acquittés. Un événement déjà vu dans la fenêtre est ignoré, le traitement reste idempotent.
+    """
+
+    def __init__(self, taille_max=100000, duree_s=24 * 3600):
+        self.taille_max = taille_max
+        self.duree_s = duree_s
+        self._vues = OrderedDict()
+
+    def deja_vu(self, cle, maintenant=None):
+        """True si `cle` a déjà été vue dans la fenêtre ; sinon la mémorise et retourne False."""
+        maintenant = time.time() if maintenant is None else maintenant
+        # Les clés sont rangées par première réception : on purge par l'avant
+        while self._vues:
+            vue_a = next(iter(self._vues.values()))
+            if len(self._vues) < self.taille_max and maintenant - vue_a < self.duree_s:
+                break
+            self._vues.popitem(last=False)
+        if cle in self._vues:
+            return True
+        self._vues[cle] = maintenant
+        return False
+
+    def __len__(self):
+        return len(self._vues)
+
+
+class ConsommateurEvenements:
+    """Décode les messages du lecteur (JSON ou trame binaire, un événement ou un lot) et traite chaque scan une fois."""
+
+    def __init__(self, fenetre=None):
+        self.fenetre = fenetre or FenetreDedoublonnage()
+        self.recus = 0
+        self.traites = 0
+        self.doublons = 0
+        self.invalides = 0
+
+    def recevoir(self, sujet, charge):
+        try:
+            evenements = decoder_charge(charge)
+        except ValueError as e:
+            self.invalides += 1
+            print(f"[MESSAGE] {sujet} → charge illisible ignorée ({len(charge)} octets) : {e}")
+            return
+        for evenement in evenements:
+            self.recus += 1
+            self._recevoir_evenement(sujet, evenement)
+
+    def _recevoir_evenement(self, sujet, evenement):
+        if not isinstance(evenement, dict) or "sequence" not in evenement:
+            # Message sans identité (ancien format, test_publish_azure.py) : affiché tel quel
+            self.invalides += 1
+            print(f"[MESSAGE] {sujet} → {evenement}")
+            return
+        cle = (evenement.get("lecteur", ""), evenement["sequence"])
+        if self.fenetre.deja_vu(cle):
+            self.doublons += 1
+            print(f"[DOUBLON] {cle[0]} #{cle[1]} ignoré")
+            return
+        self.traites += 1
+        self.traiter(evenement)
+
+    def traiter(self, evenement):
+        print(
+            f"📬 [{evenement.get('lecteur', '?')} #{evenement['sequence']}] {evenement.get('date_heure', '')} "
+            f"{evenement.get('uid', '')} {evenement.get('nom', '')} : {evenement.get('statut', '')} "
+            f"({evenement.get('type_acces', '')})"
+        )
+
+    def resume(self):
+        return (f"{self.traites} événement(s) traité(s), {self.doublons} doublon(s) ignoré(s), "
+                f"{self.invalides} message(s) hors format")
+
+
+def analyser_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Consommateur des événements d'accès publiés par les lecteurs RFID.")
+    parser.add_argument("--broker", default=BROKER)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--topic", default=TOPIC)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = analyser_arguments(argv)
+    consommateur = ConsommateurEvenements()
+
+    def on_connect(client, userdata, flags, rc): # Removed properties=None
+        print(f"[CONNECT] RC={rc}")
+        if rc == 0:
+            print("✓ Subscriber connecté")
+            # Subscribing now works because the Client Attribute is correctly set
+            client.subscribe(arguments.topic, qos=1)
+            print(f"→ Souscription à {arguments.topic}")
+        else:
+            print(f"✗ Échec connexion subscriber (RC={rc})")
+
+    def on_message(client, userdata, msg):
+        consommateur.recevoir(msg.topic, msg.payload)
+
+    client = mqtt.Client(
+        client_id="python-subscriber-test",
+        protocol=mqtt.MQTTv311
+    )
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    if arguments.port == 8883:
+        client.tls_set(
+            ca_certs=None,
+            certfile=CERTFILE,
+            keyfile=KEYFILE,
+            cert_reqs=ssl.CERT_REQUIRED,
+            tls_version=ssl.PROTOCOL_TLSv1_2
+        )
+
+        client.username_pw_set(username=USERNAME, password=None)
+
+    print("Connexion…")
+    client.connect(arguments.broker, arguments.port)
+    client.loop_start()
+
+    print("En attente de messages (Ctrl+C pour quitter)…")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Arrêt demandé.")
+
+    client.loop_stop()
+    client.disconnect()
+    print(f"[RÉSUMÉ] {consommateur.resume()}")
+    print("Déconnexion subscriber.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import time
 from rfid_lecteur import LecteurRFID
 from card_manager import CardService
 from card_utils import block_list_to_string, string_to_block_list, block_list_to_integer
+from uid_carte import normaliser_uid
 
 class AdminInterface:
     def __init__(self, gestion_csv, mifare : LecteurRFID, questions_admin, attendre_carte):
@@ -11,7 +12,7 @@ class AdminInterface:
         self.questions_admin = questions_admin
         self.attendre_carte = attendre_carte
 
-    def autoriser_admin(self, uid_string: str):
+    def autoriser_admin(self, uid_string):
         question_data = self.questions_admin.get(uid_string)
         if not question_data:
             return True
@@ -51,7 +52,7 @@ class AdminInterface:
     def supprimer_un_utilisateur(self):
         print("\n--- Suppression d'utilisateur ---")
         uid_carte = self.attendre_carte("Veuillez approcher la carte a SUPPRIMER...")
-        uid_str = "-".join(str(octet) for octet in uid_carte)
+        uid_str = normaliser_uid(uid_carte)
 
         actif, nom, _, _, _ = self.gestion_csv.verifier_carte(uid_str)
 
@@ -107,7 +108,7 @@ class AdminInterface:
 
     def configurer_carte(self):
         uid_carte = self.attendre_carte("Veuillez approcher la carte a configurer...")
-        uid_str = "-".join(str(octet) for octet in uid_carte)
+        uid_str = normaliser_uid(uid_carte)
 
         # Sécurité: carte admin interdite
         if uid_str in self.questions_admin:
@@ -180,7 +181,7 @@ class AdminInterface:
             uid_pour_ecriture = self.attendre_carte(
                 message=">>> Veuillez RESCANNER la carte maintenant pour finaliser l'ecriture... <<<"
             )
-            uid_str_verif = "-".join(str(octet) for octet in uid_pour_ecriture)
+            uid_str_verif = normaliser_uid(uid_pour_ecriture)
             if uid_str_verif != uid_str:
                 print("[ERREUR] Ce n'est pas la même carte ! Annulation.")
                 return
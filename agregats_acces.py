@@ -0,0 +1,115 @@
+import json
+import os
+from collections import Counter
+
+from ecriture_atomique import ecrire_fichier_atomique
+from evenement_acces import TYPES_ACCES, classifier_statut, lire_evenements, lire_evenements_depuis
+from rotation_historique import ManifesteSegments
+
+VERSION_AGREGATS = 1
+
+
+def fichier_agregats(chemin_historique):
+    return chemin_historique + ".stats.json"
+
+
+class AgregatsAcces:
+    """Compteurs d'accès pré-agrégés : par type, par jour, par heure de la journée et par UID.
+
+    Tenus à jour par JournalRFID à chaque lot écrit et persistés dans <historique>.stats.json
+    avec la position (octets) de l'historique qu'ils couvrent. Les statistiques s'ouvrent
+    sans relire l'historique ; seules les lignes écrites après cette position sont rattrapées.
+    """
+
+    def __init__(self, chemin_historique):
+        self.chemin_historique = chemin_historique
+        self.chemin_agregats = fichier_agregats(chemin_historique)
+        self._reinitialiser()
+
+    def _reinitialiser(self):
+        self.total = 0
+        self.par_type = Counter({type_acces: 0 for type_acces in TYPES_ACCES})
+        self.par_jour = {}
+        self.par_heure = Counter()
+        self.par_uid = Counter()
+        self.position = 0
+        self.inode = None
+
+    def ajouter(self, date_heure, uid, statut):
+        type_acces = classifier_statut(statut)
+        self.total += 1
+        self.par_type[type_acces] += 1
+        # "AAAA-MM-JJ HH:MM:SS" : jour et heure sans analyser la date
+        self.par_jour.setdefault(date_heure[:10], Counter())[type_acces] += 1
+        self.par_heure[date_heure[11:13]] += 1
+        self.par_uid[uid] += 1
+
+    def ajouter_evenement(self, evenement):
+        self.ajouter(evenement.date_heure, evenement.uid, evenement.statut)
+
+    def charger(self):
+        self._reinitialiser()
+        try:
+            with open(self.chemin_agregats, "r", encoding="utf-8") as fichier:
+                donnees = json.load(fichier)
+        except (OSError, ValueError):
+            return False
+        if donnees.get("version") != VERSION_AGREGATS:
+            return False
+        self.total = donnees.get("total", 0)
+        self.par_type.update(donnees.get("par_type", {}))
+        self.par_jour = {jour: Counter(types) for jour, types in donnees.get("par_jour", {}).items()}
+        self.par_heure = Counter(donnees.get("par_heure", {}))
+        self.par_uid = Counter(donnees.get("par_uid", {}))
+        self.position = donnees.get("position", 0)
+        self.inode = donnees.get("inode")
+        return True
+
+    def synchroniser(self, enregistrer=True):
+        """Charge les compteurs et rattrape les lignes de l'historique qu'ils ne couvrent pas encore.
+
+        Historique remplacé ou tronqué : recalcul complet (segments archivés compris).
+        enregistrer=False pour un simple lecteur.
+        """
+        try:
+            stat = os.stat(self.chemin_historique)
+        except OSError:
+            self._reinitialiser()
+            return self
+        if not self.charger() or self.inode != stat.st_ino or self.position > stat.st_size:
+            self._reinitialiser()
+            manifeste = ManifesteSegments(self.chemin_historique).charger()
+            for segment in manifeste.segments:
+                for evenement in lire_evenements(manifeste.chemin_segment(segment)):
+                    self.ajouter_evenement(evenement)
+        self.inode = stat.st_ino
+        if self.position < stat.st_size:
+            evenements, self.position = lire_evenements_depuis(self.chemin_historique, self.position)
+            for evenement in evenements:
+                self.ajouter_evenement(evenement)
+            if enregistrer:
+                self.enregistrer(self.position)
+        return self
+
+    def changer_de_fichier(self):
+        """Après une rotation : les compteurs continuent sur le nouveau fichier courant."""
+        stat = os.stat(self.chemin_historique)
+        self.inode = stat.st_ino
+        self.enregistrer(stat.st_size)
+
+    def enregistrer(self, position):
+        """Persiste les compteurs (écriture atomique) ; position = fin de l'historique couvert."""
+        self.position = position
+        donnees = {
+            "version": VERSION_AGREGATS,
+            "inode": self.inode,
+            "position": self.position,
+            "total": self.total,
+            "par_type": dict(self.par_type),
+            "par_jour": {jour: dict(types) for jour, types in self.par_jour.items()},
+            "par_heure": dict(self.par_heure),
+            "par_uid": dict(self.par_uid),
+        }
+        ecrire_fichier_atomique(
+            self.chemin_agregats, lambda fichier: json.dump(donnees, fichier, ensure_ascii=False)
+        )
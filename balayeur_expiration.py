@@ -0,0 +1,50 @@
+import threading
+from datetime import datetime, timedelta
+
+
+class BalayeurExpiration:
+    """Désactive les cartes expirées en tâche de fond : au démarrage, à minuit et à intervalle régulier.
+
+    Le scan ne fait plus qu'une comparaison de dates en mémoire et n'écrit jamais sur le disque.
+    """
+
+    def __init__(self, gestion_cartes, intervalle=3600):
+        self.gestion_cartes = gestion_cartes
+        self.intervalle = intervalle
+        self._arret = threading.Event()
+        self._thread = None
+
+    def demarrer(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._boucle, daemon=True)
+        self._thread.start()
+
+    def arreter(self):
+        self._arret.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def balayer(self):
+        try:
+            expirees = self.gestion_cartes.desactiver_cartes_expirees()
+        except Exception as e:
+            print(f"[ERREUR] Balayage des cartes expirées : {e}")
+            return []
+        if expirees:
+            print(f"[AUTO] {len(expirees)} carte(s) expirée(s) désactivée(s).")
+        return expirees
+
+    def _delai_prochain_balayage(self):
+        maintenant = datetime.now()
+        minuit = datetime.combine(maintenant.date() + timedelta(days=1), datetime.min.time())
+        delai = (minuit - maintenant).total_seconds()
+        if self.intervalle:
+            delai = min(delai, self.intervalle)
+        return max(delai, 1)
+
+    def _boucle(self):
+        self.balayer()
+        while not self._arret.wait(self._delai_prochain_balayage()):
+            self.balayer()
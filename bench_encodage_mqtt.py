@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Benchmark des encodages MQTT : octets par événement et temps d'encodage, événement par
+# événement et par lots, contre l'ancien json.dumps par événement.
+#
+#   python bench_encodage_mqtt.py [--evenements 20000] [--lot 20]
+
+import argparse
+import json
+import random
+import time
+
+from encodage_mqtt import ENCODAGES, creer_encodeur, decoder_charge
+
+NOMS = ["Alice Tremblay", "Bob Gagnon", "Chloé Roy", "David Côté", "Admin"]
+STATUTS = [
+    ("Accepte", "autorise", ""),
+    ("Refusé - Carte inconnue", "refuse", "carte_inconnue"),
+    ("Refusé - Carte expirée", "refuse", "carte_expiree"),
+    ("Carte desactivee", "desactive", "carte_desactivee"),
+]
+
+
+def generer_messages(nombre):
+    aleatoire = random.Random(42)
+    messages = []
+    for sequence in range(1, nombre + 1):
+        statut, type_acces, raison = aleatoire.choice(STATUTS)
+        credits = aleatoire.randint(0, 50)
+        messages.append({
+            "date_heure": f"2026-10-{aleatoire.randint(1, 28):02d} {aleatoire.randint(0, 23):02d}:"
+                          f"{aleatoire.randint(0, 59):02d}:{aleatoire.randint(0, 59):02d}",
+            "lecteur": "lecteur-entree-1",
+            "uid": "-".join(str(aleatoire.randint(0, 255)) for _ in range(5)),
+            "type_carte": "MIFARE",
+            "nom": aleatoire.choice(NOMS),
+            "statut": statut,
+            "raison": raison,
+            "credits_avant": credits,
+            "credits_apres": max(0, credits - 1) if type_acces == "autorise" else credits,
+            "latence_ms": round(aleatoire.uniform(5, 80), 1),
+            "sequence": sequence,
+            "type_acces": type_acces,
+        })
+    return messages
+
+
+def mesurer(encodeur, messages, taille_lot):
+    debut = time.perf_counter()
+    charges = []
+    for depart in range(0, len(messages), taille_lot):
+        enregistrements = [encodeur.encoder(message) for message in messages[depart:depart + taille_lot]]
+        charges.append(encodeur.assembler(enregistrements, lot=taille_lot > 1))
+    duree = time.perf_counter() - debut
+    octets = sum(len(charge) for charge in charges)
+
+    # Contrôle : le décodeur du consommateur retrouve les mêmes événements
+    decodes = [evenement for charge in charges for evenement in decoder_charge(charge)]
+    assert len(decodes) == len(messages)
+    assert all(d["sequence"] == m["sequence"] and d["uid"] == m["uid"] and d["date_heure"] == m["date_heure"]
+               for d, m in zip(decodes, messages))
+    return octets / len(messages), duree * 1e6 / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des encodages MQTT")
+    parser.add_argument("--evenements", type=int, default=20_000)
+    parser.add_argument("--lot", type=int, default=20)
+    arguments = parser.parse_args()
+
+    messages = generer_messages(arguments.evenements)
+
+    # Référence : l'ancien publish(), un json.dumps par événement et par message MQTT
+    debut = time.perf_counter()
+    octets_reference = sum(len(json.dumps(message).encode("utf-8")) for message in messages)
+    duree_reference = (time.perf_counter() - debut) * 1e6 / len(messages)
+    octets_reference /= len(messages)
+
+    print(f"{arguments.evenements} evenements synthetiques, lots de {arguments.lot}\n")
+    print(f"{'encodage':<14}{'lot':>5}{'octets/evt':>13}{'gain':>8}{'us/evt':>10}")
+    print(f"{'json.dumps':<14}{1:>5}{octets_reference:>13.1f}{'x1.0':>8}{duree_reference:>10.1f}")
+    for encodage in ENCODAGES:
+        encodeur = creer_encodeur(encodage)
+        for taille_lot in (1, arguments.lot):
+            octets, duree = mesurer(encodeur, messages, taille_lot)
+            gain = f"x{octets_reference / octets:.1f}"
+            print(f"{encodage:<14}{taille_lot:>5}{octets:>13.1f}{gain:>8}{duree:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# Benchmark du filtrage de l'historique : classification memorisee et passage unique
+# contre l'ancienne version (deux classifications par entree, copies des entrees).
+#
+#   python bench_historique.py [--lignes 1000000]
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from historique import HistoriqueDesAcces, classifier_statut
+
+STATUTS = [
+    "Accepte",
+    "Accepté",
+    "Refusé - Carte inconnue",
+    "Refusé - Carte expirée",
+    "Refusé - Hors horaire",
+    "Refusé - Jour non autorisé",
+    "Carte desactivee",
+    "Tentative suspicieuse",
+    "refuse",
+    "accepte",
+]
+
+
+def ancien_determiner_type_acces(statut):
+    statut_lower = statut.lower()
+
+    if any(mot in statut_lower for mot in ['accepte', 'autorise', 'valide', 'succes']):
+        return 'autorise'
+    elif any(mot in statut_lower for mot in ['desactive', 'carte desactivee']):
+        return 'desactive'
+    elif any(mot in statut_lower for mot in ['alerte', 'suspicieux', 'tentative', 'illegitime']):
+        return 'alerte'
+    elif any(mot in statut_lower for mot in ['refuse', 'refus', 'non autorise', 'invalide']):
+        return 'refuse'
+    else:
+        return 'indetermine'
+
+
+def ancien_filtrer_historique(entrees, filtre):
+    entrees_filtrees = []
+    for entree in entrees:
+        type_acces = ancien_determiner_type_acces(entree['statut'])
+        if filtre == 'tous' or filtre == type_acces:
+            entree_complete = entree.copy()
+            entree_complete['type_acces'] = type_acces
+            entrees_filtrees.append(entree_complete)
+
+    statistiques = {'autorise': 0, 'refuse': 0, 'alerte': 0, 'desactive': 0, 'indetermine': 0}
+    for entree in entrees:
+        type_acces = ancien_determiner_type_acces(entree['statut'])
+        statistiques[type_acces] = statistiques.get(type_acces, 0) + 1
+    return entrees_filtrees, statistiques
+
+
+def generer_entrees(nombre):
+    aleatoire = random.Random(42)
+    return [
+        {
+            'date_heure': f"2025-01-01 00:00:{i % 60:02d}",
+            'uid': f"{aleatoire.randrange(256)}-{aleatoire.randrange(256)}-1-2",
+            'type_carte': 'MIFARE',
+            'nom': 'Porteur',
+            'statut': aleatoire.choice(STATUTS),
+        }
+        for i in range(nombre)
+    ]
+
+
+def chronometrer(fonction):
+    debut = time.perf_counter()
+    resultat = fonction()
+    return time.perf_counter() - debut, resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du filtrage de l'historique")
+    parser.add_argument("--lignes", type=int, default=1_000_000)
+    parser.add_argument("--filtre", default="refuse")
+    arguments = parser.parse_args()
+
+    print(f"Generation de {arguments.lignes} entrees synthetiques...")
+    entrees = generer_entrees(arguments.lignes)
+
+    duree_ancienne, (filtrees_ancien, stats_ancien) = chronometrer(
+        lambda: ancien_filtrer_historique(entrees, arguments.filtre)
+    )
+
+    # Nouvelle version : classification au chargement (memorisee par statut), puis un seul passage
+    classifier_statut.cache_clear()
+    historique = HistoriqueDesAcces.__new__(HistoriqueDesAcces)
+    # Fichier de travail sans segments archives : le filtre ne mesure que les entrees en memoire
+    historique.fichier_historique = os.path.join(tempfile.mkdtemp(), "historique_acces.csv")
+    historique._cache_segments = {}
+    historique._historique_charge = True
+
+    def charger():
+        for entree in entrees:
+            entree['type_acces'] = classifier_statut(entree['statut'])
+        historique.entrees_historique = entrees
+
+    duree_classification, _ = chronometrer(charger)
+    duree_filtre, resultat = chronometrer(lambda: historique.filtrer_historique(arguments.filtre))
+    duree_nouvelle = duree_classification + duree_filtre
+
+    assert stats_ancien == resultat['statistiques']
+    assert len(filtrees_ancien) == resultat['nombre_filtre']
+
+    print(f"Ancienne version : {duree_ancienne:.3f} s")
+    print(f"Nouvelle version : {duree_nouvelle:.3f} s "
+          f"(classification {duree_classification:.3f} s + filtre/statistiques {duree_filtre:.3f} s)")
+    print(f"Filtre seul (menu, donnees deja chargees) : {duree_filtre:.3f} s")
+    print(f"Acceleration : x{duree_ancienne / duree_nouvelle:.1f} "
+          f"(x{duree_ancienne / duree_filtre:.1f} sur un filtre repete)")
+    print(f"Statuts distincts classes : {classifier_statut.cache_info().currsize}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,184 @@
 import csv
+import json
 import os
-from datetime import datetime 
+import threading
+import time
+from datetime import datetime
 from tabulate import tabulate 
+from decision_acces import carte_inconnue, evaluer_ligne, politique_de_ligne
+from filtre_uid import CacheNegatif
+from ecriture_atomique import GroupeCommit, ecrire_fichier_atomique
+
+
+def afficher_table_cartes(lignes):
+    if not lignes:
+        print("\nAUCUNE CARTE ENREGISTRÉE.\n")
+        return
+
+    table_data = []
+    for ligne in lignes:
+        actif_visuel = "Oui" if str(ligne.get("Actif")).lower() == "true" else "Non"
+        
+        jours = ligne.get("Jours", "")
+        if not jours:
+            jours_visuel = "Tous"
+        else:
+            jours_visuel = jours
+
+
+        table_data.append([
+            ligne.get("Id", "?"),
+            ligne.get("Nom", "Inconnu"),
+            ligne.get("Credits", "0"),
+            actif_visuel,
+            ligne.get("Expiration", "-"),
+            f"{ligne.get('Debut','')} - {ligne.get('Fin','')}", 
+            jours_visuel,
+            ligne.get("UID", "")
+        ])
+
+    headers = ["ID", "Nom", "Crédits", "Actif","Expiration","Horaires","Jours", "UID "]
+    
+    print("\n" + "="*50)
+    print(" LISTE DES UTILISATEURS")
+    print("="*50)
+    print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
+    print("\n")
+
+
+def _normaliser_actif(valeur):
+    if isinstance(valeur, bool):
+        return valeur
+    texte = str(valeur).strip().lower()
+    if texte in ("true", "oui", "1", "vrai"):
+        return True
+    if texte in ("false", "non", "0", "faux", ""):
+        return False
+    raise ValueError(f"Actif invalide : {valeur!r}")
+
+
+def valider_ligne_carte(donnees):
+    """Valide une carte à importer et la retourne au format des lignes du CSV.
+
+    Les clés sont acceptées sans tenir compte de la casse (\"uid\" ou \"UID\").
+    Lève ValueError si une valeur est invalide.
+    """
+    champs = {str(cle).strip().lower(): valeur for cle, valeur in donnees.items()}
+
+    def texte(cle):
+        valeur = champs.get(cle)
+        return "" if valeur is None else str(valeur).strip()
+
+    uid = texte("uid")
+    octets = uid.split("-")
+    if not uid or not all(octet.isdigit() and int(octet) <= 255 for octet in octets):
+        raise ValueError(f"UID invalide : {uid!r}")
+
+    try:
+        credits = int(texte("credits") or 0)
+    except ValueError:
+        raise ValueError(f"Crédits invalides : {texte('credits')!r}")
+    if credits < 0:
+        raise ValueError("Les crédits ne peuvent pas être négatifs")
+
+    expiration = texte("expiration")
+    if expiration:
+        try:
+            datetime.strptime(expiration, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"Expiration invalide (AAAA-MM-JJ) : {expiration!r}")
+
+    debut, fin = texte("debut"), texte("fin")
+    if bool(debut) != bool(fin):
+        raise ValueError("Debut et Fin doivent être renseignés ensemble")
+    for heure in (debut, fin):
+        if heure:
+            try:
+                datetime.strptime(heure, "%H:%M")
+            except ValueError:
+                raise ValueError(f"Heure invalide (HH:MM) : {heure!r}")
+
+    jours = texte("jours")
+    if jours and not all(jour.isdigit() and 0 <= int(jour) <= 6 for jour in jours.split("-")):
+        raise ValueError(f"Jours invalides (0 à 6 séparés par '-') : {jours!r}")
+
+    actif = champs.get("actif")
+    return {
+        "UID": uid,
+        "Nom": texte("nom"),
+        "Actif": str(_normaliser_actif(True if actif is None else actif)),
+        "Credits": str(credits),
+        "Id": "",
+        "Expiration": expiration,
+        "Debut": debut,
+        "Fin": fin,
+        "Jours": jours,
+    }
+
+
+def lire_cartes_a_importer(chemin):
+    """Lit les cartes d'un fichier CSV ou JSON (liste, ou objet avec une clé \"cartes\")."""
+    if chemin.lower().endswith(".json"):
+        with open(chemin, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            data = data.get("cartes", [])
+        yield from data
+    else:
+        with open(chemin, 'r', encoding='utf-8') as file:
+            yield from csv.DictReader(file)
+
+
+def ecrire_cartes_exportees(lignes, chemin, colonnes):
+    if chemin.lower().endswith(".json"):
+        with open(chemin, 'w', encoding='utf-8') as file:
+            json.dump({"cartes": lignes}, file, ensure_ascii=False, indent=2)
+    else:
+        with open(chemin, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=colonnes)
+            writer.writeheader()
+            writer.writerows(lignes)
+
+
 class GestionCartesCSV:
-    def __init__(self, nom_fichier="cartes_autorisees.csv"):
+    COLONNES_LEDGER = ["Date", "UID", "Delta", "Solde"]
+
+    def __init__(self, nom_fichier="cartes_autorisees.csv", seuil_ledger_octets=64 * 1024,
+                 age_max_ledger=3600, intervalle_compaction=60, ttl_cache_negatif=5.0,
+                 fenetre_groupe=0.05):
         self.nom_fichier = nom_fichier
         self.colonnes = ["UID", "Nom", "Actif", "Credits", "Id", "Expiration", "Debut", "Fin","Jours"]        
+        # Journal des crédits en ajout seul : évite de réécrire tout le CSV à chaque débit
+        self.fichier_ledger = os.path.splitext(nom_fichier)[0] + "_credits.ledger"
+        self.seuil_ledger_octets = seuil_ledger_octets
+        self.age_max_ledger = age_max_ledger
+        self._debut_ledger = None
+        # Compteur du prochain Id persisté : allocation en O(1) sans parcourir la table
+        self.fichier_compteur_id = os.path.splitext(nom_fichier)[0] + ".next_id"
+        self._prochain_id = 1
+        # Index en mémoire UID -> ligne, rechargé seulement si le fichier change
+        self._lignes = []
+        self._index = {}
+        self._politiques = {}
+        self._signature = None
+        # UID inconnus récemment refusés ; l'index (dict) sert lui-même de filtre d'appartenance
+        self._cache_negatif = CacheNegatif(ttl=ttl_cache_negatif)
+        self._verrou = threading.RLock()
+        # Écritures disque (CSV atomique + ledger) : toujours pris après _verrou, jamais l'inverse
+        self._verrou_fichiers = threading.Lock()
+        # Dernier état publié (lignes, taille du ledger déjà incluse) en attente d'écriture durable
+        self._instantane = None
+        self._groupe = GroupeCommit(self._ecrire_instantane, fenetre=fenetre_groupe, nom="CSV")
         self._initialiser_fichier()
+        self._rafraichir_index()
+
+        self._arret = threading.Event()
+        self._thread_compaction = None
+        if intervalle_compaction:
+            self._thread_compaction = threading.Thread(
+                target=self._boucle_compaction, args=(intervalle_compaction,), daemon=True
+            )
+            self._thread_compaction.start()
 
     def _initialiser_fichier(self):
         if not os.path.exists(self.nom_fichier):
@@ -19,7 +191,177 @@ class GestionCartesCSV:
             except Exception as e:
                 print(f"[ERREUR CRITIQUE] Impossible de créer le CSV : {e}")
 
+    @staticmethod
+    def _stat(chemin):
+        try:
+            stat = os.stat(chemin)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _signature_fichier(self):
+        # (mtime, taille) du CSV et du ledger : change dès qu'un autre processus les écrit
+        signature_csv = self._stat(self.nom_fichier)
+        if signature_csv is None:
+            return None
+        return (signature_csv, self._stat(self.fichier_ledger))
+
+    def _indexer(self, lignes):
+        self._lignes = lignes
+        self._index = {}
+        max_id = 0
+        for ligne in lignes:
+            # En cas de doublon on garde la première ligne, comme l'ancien parcours linéaire
+            self._index.setdefault(ligne.get("UID"), ligne)
+            id_courant = ligne.get("Id") or ""
+            if id_courant.isdigit() and int(id_courant) > max_id:
+                max_id = int(id_courant)
+        # Le compteur persisté ne recule jamais, même si la plus haute carte a été supprimée
+        self._prochain_id = max(self._lire_compteur_id(), max_id + 1)
+        # Politiques compilées une fois au chargement / à chaque modification
+        self._politiques = {uid: politique_de_ligne(ligne) for uid, ligne in self._index.items()}
+        # Une carte a pu être ajoutée : les refus mémorisés ne sont plus fiables
+        self._cache_negatif.invalider()
+
+    def _rafraichir_index(self):
+        with self._verrou:
+            # Une sauvegarde est en cours : la mémoire est plus récente que le disque
+            if self._groupe.en_attente():
+                return
+            signature = self._signature_fichier()
+            if signature is not None and signature == self._signature:
+                return
+            self._indexer(self._lire_fichier())
+            self._rejouer_ledger()
+            self._signature = signature
+
+    def _obtenir_carte(self, uid):
+        #Recherche O(1) d'une carte dans l'index
+        with self._verrou:
+            self._rafraichir_index()
+            return self._index.get(uid)
+
     def _lire_toutes_les_donnees(self):
+        #Copie des lignes de l'index, modifiable sans toucher au cache
+        with self._verrou:
+            self._rafraichir_index()
+            return [dict(ligne) for ligne in self._lignes]
+
+    # ---- Compteur d'Id ----
+    def _lire_compteur_id(self):
+        try:
+            with open(self.fichier_compteur_id, 'r', encoding='utf-8') as file:
+                return int(file.read().strip() or 1)
+        except (OSError, ValueError):
+            return 1
+
+    def _allouer_ids(self, nombre=1):
+        """Réserve `nombre` Id consécutifs et persiste le compteur."""
+        premier = self._prochain_id
+        self._prochain_id += nombre
+        try:
+            ecrire_fichier_atomique(self.fichier_compteur_id, lambda file: file.write(str(self._prochain_id)))
+        except OSError as e:
+            print(f"[ERREUR ECRITURE] Compteur d'Id : {e}")
+        return [str(premier + i) for i in range(nombre)]
+
+    # ---- Ledger des crédits ----
+    def _rejouer_ledger(self):
+        # Solde courant = snapshot CSV + entrées du ledger (le Solde rend la relecture idempotente)
+        self._debut_ledger = None
+        if not os.path.exists(self.fichier_ledger):
+            return
+        try:
+            with open(self.fichier_ledger, 'r', encoding='utf-8') as file:
+                for entree in csv.DictReader(file, fieldnames=self.COLONNES_LEDGER):
+                    ligne = self._index.get(entree.get("UID"))
+                    if ligne is not None and entree.get("Solde") is not None:
+                        ligne["Credits"] = entree["Solde"]
+                    if self._debut_ledger is None:
+                        try:
+                            self._debut_ledger = datetime.strptime(entree["Date"], "%Y-%m-%d %H:%M:%S").timestamp()
+                        except (TypeError, ValueError):
+                            self._debut_ledger = time.time()
+        except Exception as e:
+            print(f"[ERREUR LECTURE] Ledger des crédits : {e}")
+
+    def _ajouter_au_ledger(self, uid, delta, solde):
+        try:
+            with self._verrou_fichiers, open(self.fichier_ledger, 'a', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), uid, delta, solde])
+                file.flush()
+                os.fsync(file.fileno())
+        except Exception as e:
+            print(f"[ERREUR ECRITURE] Ledger des crédits : {e}")
+            return False
+        if self._debut_ledger is None:
+            self._debut_ledger = time.time()
+        return True
+
+    def _modifier_credits(self, uid, calculer_solde):
+        # Applique un débit/crédit en mémoire et l'ajoute au ledger, sans réécrire le CSV
+        with self._verrou:
+            ligne = self._obtenir_carte(uid)
+            if ligne is None:
+                return None
+            try:
+                credits_actuels = int(ligne.get("Credits", "0"))
+            except ValueError:
+                credits_actuels = 0
+            nouveau_solde = calculer_solde(credits_actuels)
+            if nouveau_solde is None:
+                return credits_actuels, None
+            if nouveau_solde != credits_actuels:
+                if not self._ajouter_au_ledger(uid, nouveau_solde - credits_actuels, nouveau_solde):
+                    return credits_actuels, None
+                ligne["Credits"] = str(nouveau_solde)
+                self._signature = self._signature_fichier()
+            return credits_actuels, nouveau_solde
+
+    def _ledger_a_compacter(self):
+        signature = self._stat(self.fichier_ledger)
+        if signature is None or signature[1] == 0:
+            return False
+        if signature[1] >= self.seuil_ledger_octets:
+            return True
+        return self._debut_ledger is not None and time.time() - self._debut_ledger >= self.age_max_ledger
+
+    def compacter_ledger(self, forcer=False):
+        """Replie le ledger dans le CSV (une seule réécriture) puis le vide."""
+        with self._verrou:
+            self._rafraichir_index()
+            if not forcer and not self._ledger_a_compacter():
+                return False
+            if self._stat(self.fichier_ledger) is None:
+                return False
+            self._publier_donnees([dict(ligne) for ligne in self._lignes])
+        succes = self._attendre_sauvegarde()
+        if succes:
+            print("[CSV] Ledger des crédits compacté.")
+        return succes
+
+    def _boucle_compaction(self, intervalle):
+        while not self._arret.wait(intervalle):
+            try:
+                self.compacter_ledger()
+            except Exception as e:
+                print(f"[ERREUR] Compaction du ledger : {e}")
+
+    def fermer(self, compacter=True):
+        """Arrête les threads ; compacter=False laisse le CSV et le ledger intacts (lecture seule)."""
+        self._arret.set()
+        if self._thread_compaction is not None:
+            self._thread_compaction.join(timeout=2)
+        if compacter:
+            self.compacter_ledger(forcer=True)
+        self._groupe.arreter()
+
+    def statistiques_ecriture(self):
+        """Latence des sauvegardes et nombre de mises à jour regroupées par écriture."""
+        return self._groupe.statistiques()
+
+    def _lire_fichier(self):
         #Charge  le contenu du fichier CSV dans une liste en mémoire
         donnees = []
         if os.path.exists(self.nom_fichier):
@@ -32,149 +374,138 @@ class GestionCartesCSV:
                 print(f"[ERREUR LECTURE] {e}")
         return donnees
 
+    def _publier_donnees(self, lignes):
+        #Rend les lignes visibles en mémoire tout de suite et les prépare pour l'écriture groupée.
+        #À appeler sous self._verrou ; les lignes contiennent déjà les soldes du ledger.
+        with self._verrou:
+            self._indexer([dict(ligne) for ligne in lignes])
+            signature_ledger = self._stat(self.fichier_ledger)
+            self._instantane = (lignes, signature_ledger[1] if signature_ledger else 0)
+
+    def _attendre_sauvegarde(self):
+        #À appeler hors de self._verrou pour que les mises à jour voisines soient regroupées
+        return self._groupe.soumettre()
+
     def _sauvegarder_donnees(self, lignes):
-        #Prend une liste  en mémoire et écrase le fichier CSV avec.
-        try:
-            with open(self.nom_fichier, 'w', newline='', encoding='utf-8') as file:
+        #Prend une liste  en mémoire et écrase le fichier CSV avec (écriture atomique groupée).
+        self._publier_donnees(lignes)
+        return self._attendre_sauvegarde()
+
+    def _ecrire_instantane(self):
+        # Appelé par le thread du GroupeCommit : écrit le dernier état publié
+        with self._verrou_fichiers:
+            lignes, taille_ledger = self._instantane
+
+            def ecrire(file):
                 writer = csv.DictWriter(file, fieldnames=self.colonnes)
-                writer.writeheader()      
-                writer.writerows(lignes)  
+                writer.writeheader()
+                writer.writerows(lignes)
+
+            try:
+                ecrire_fichier_atomique(self.nom_fichier, ecrire)
+                self._vider_ledger(taille_ledger)
+            except Exception as e:
+                print(f"[ERREUR ECRITURE] Impossible de sauvegarder : {e}")
+                # Le disque fait foi : rechargement au prochain accès
+                self._signature = None
+                return False
+            # Le fichier vient d'être écrit par ce processus : l'index suit sans relecture
+            self._signature = self._signature_fichier()
             return True
-        except Exception as e:
-            print(f"[ERREUR ECRITURE] Impossible de sauvegarder : {e}")
-            return False
+
+    def _vider_ledger(self, taille_incluse):
+        # Retire du ledger les entrées déjà repliées dans le CSV ; garde celles arrivées depuis
+        signature = self._stat(self.fichier_ledger)
+        if signature is None:
+            self._debut_ledger = None
+            return
+        if signature[1] <= taille_incluse:
+            os.remove(self.fichier_ledger)
+            self._debut_ledger = None
+            return
+        with open(self.fichier_ledger, 'rb') as file:
+            file.seek(taille_incluse)
+            reste = file.read()
+        ecrire_fichier_atomique(self.fichier_ledger, lambda f: f.write(reste), binaire=True)
+        self._debut_ledger = time.time()
     
+    def evaluer_carte(self, uid_recherche):
+        """Une seule recherche dans l'index et un seul ResultatVerification par scan."""
+        # Essai répété d'une carte inconnue : ni stat du fichier ni recherche
+        if self._cache_negatif.contient(uid_recherche):
+            return carte_inconnue(uid_recherche)
+        ligne = self._obtenir_carte(uid_recherche)
+        if ligne is None:
+            self._cache_negatif.ajouter(uid_recherche)
+            return carte_inconnue(uid_recherche)
+
+        # Comparaison en mémoire seulement : la désactivation est faite par le BalayeurExpiration
+        return evaluer_ligne(uid_recherche, ligne, self._politiques.get(uid_recherche))
+
     def verifier_carte(self, uid_recherche):
-        # On lit tout pour pouvoir modifier si expiré
-        toutes_les_lignes = self._lire_toutes_les_donnees()
-        carte_trouvee = False
-        ligne_modifiee = None
-        acces_horaire = False
-
-        nom = "Inconnu"
-        message = "Refusé - Carte inconnue"
-        credits = "0"
-        id_interne = ""
-
-        for ligne in toutes_les_lignes:
-            if ligne.get("UID") == uid_recherche:
-                carte_trouvee = True
-                nom = ligne.get("Nom", "Inconnu")
-                credits = ligne.get("Credits", "0")
-                id_interne = ligne.get("Id", "")
-                expiration_str = ligne.get("Expiration", "")
-                
-                est_actif = str(ligne.get("Actif")).strip().lower() == "true"
-                
-                # expiration
-                if est_actif and expiration_str:
-                    try:
-                        date_exp = datetime.strptime(expiration_str, "%Y-%m-%d")
-                        if datetime.now() > date_exp:
-                            print(f"[AUTO] Carte {nom} expirée le {expiration_str}. Désactivation...")
-                            ligne["Actif"] = "False" # si expire on modifie
-                            est_actif = False
-                            ligne_modifiee = True
-                            message = f"Refusé (Expiré le {expiration_str})"
-                    except ValueError:
-                        pass
-                # jours de la semaine
-                jours_autorises = ligne.get("Jours", "")
-                if est_actif and jours_autorises:
-                    #0=lundi/6=dimanche
-                    jour_actuel = str(datetime.now().weekday()) 
-                    liste_jours = jours_autorises.split("-") 
-                    
-                    if jour_actuel not in liste_jours:
-                        est_actif = False
-                        jours_noms = ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"]
-                        nom_jour = jours_noms[int(jour_actuel)]
-                        message = f"Refusé pour la journée du {nom_jour}"
-
-                heure_debut_str = ligne.get("Debut", "")
-                heure_fin_str = ligne.get("Fin", "")
-
-                if est_actif  and heure_debut_str and heure_fin_str:
-                    try:
-                        maintenant = datetime.now().time()
-                        debut = datetime.strptime(heure_debut_str, "%H:%M").time()
-                        fin = datetime.strptime(heure_fin_str, "%H:%M").time()
-                
-                        if debut <= fin:
-                            # Cas entre 08:00 et 16:00
-                            if debut <= maintenant <= fin:
-                                acces_horaire = True
-                        else:
-                        # Cas entre 22:00 et 06:00
-                            if maintenant >= debut or maintenant <= fin:
-                                acces_horaire = True
-
-                        if not acces_horaire:
-                            message = f"Refusé (Horaire {heure_debut_str}-{heure_fin_str})"
-                            est_actif = False 
-            
-                    except ValueError:
-                        pass
-                if not message.startswith("Refusé"): 
-                    message = "Accepté" if est_actif else "Refusé (Désactivé)"
-                break
-        
-        if carte_trouvee and ligne_modifiee:
-            self._sauvegarder_donnees(toutes_les_lignes)
+        return self.evaluer_carte(uid_recherche).comme_tuple()
 
-        if carte_trouvee:
-            return est_actif, nom, message, credits, id_interne
-        else:
-            return False, "Non renseigne", "Refusé - Carte inconnue", "0", ""
+    def desactiver_cartes_expirees(self, maintenant=None):
+        """Passe Actif=False pour toutes les cartes expirées, en une seule écriture."""
+        if maintenant is None:
+            maintenant = datetime.now()
+        with self._verrou:
+            toutes_les_lignes = self._lire_toutes_les_donnees()
+            expirees = []
+            for ligne in toutes_les_lignes:
+                if politique_de_ligne(ligne).evaluer(maintenant) == "expiree":
+                    print(f"[AUTO] Carte {ligne.get('Nom')} expirée le {ligne.get('Expiration')}. Désactivation...")
+                    ligne["Actif"] = "False"
+                    expirees.append(ligne.get("UID"))
+            if not expirees:
+                return expirees
+            self._publier_donnees(toutes_les_lignes)
+        if not self._attendre_sauvegarde():
+            return []
+        return expirees
 
     def ajouter_ou_modifier_carte(self, uid, nom, actif, credits,expiration="",debut="", fin="",jours=""):
-        toutes_les_lignes = self._lire_toutes_les_donnees() 
-        
-        carte_trouvee = False
-        max_id = 0      
-        id_final = None 
-
-        for ligne in toutes_les_lignes:
-            id_courant_str = ligne.get("Id", "0")
-            if id_courant_str and id_courant_str.isdigit():
-                id_val = int(id_courant_str)
-                if id_val > max_id:
-                    max_id = id_val
-            
-            if ligne.get("UID") == uid:
-                ligne["Nom"] = nom
-                ligne["Actif"] = str(actif)
-                ligne["Credits"] = str(credits)
-                ligne["Expiration"] = expiration
-                ligne["Debut"] = debut 
-                ligne["Fin"] = fin
-                ligne["Jours"] = jours
-                
-                if ligne.get("Id"):
-                    id_final = ligne["Id"]
-                carte_trouvee = True
-
-        # nouvelles cartes sans ID
-        if not carte_trouvee:
-            nouvel_id = max_id + 1
-            id_final = str(nouvel_id)
-            
-            nouvelle_ligne = {
-                "UID": uid,
-                "Nom": nom,
-                "Actif": str(actif),
-                "Credits": str(credits),
-                "Id": id_final,
-                "Expiration": expiration,
-                "Debut": debut, 
-                "Fin": fin,
-                "Jours": jours
+        uid = str(uid)
+        with self._verrou:
+            toutes_les_lignes = self._lire_toutes_les_donnees() 
+            carte_trouvee = uid in self._index
+            id_final = None 
+
+            if carte_trouvee:
+                for ligne in toutes_les_lignes:
+                    if ligne.get("UID") == uid:
+                        ligne["Nom"] = nom
+                        ligne["Actif"] = str(actif)
+                        ligne["Credits"] = str(credits)
+                        ligne["Expiration"] = expiration
+                        ligne["Debut"] = debut 
+                        ligne["Fin"] = fin
+                        ligne["Jours"] = jours
+                        
+                        if ligne.get("Id"):
+                            id_final = ligne["Id"]
+
+            # nouvelles cartes sans ID
+            else:
+                id_final = self._allouer_ids()[0]
                 
-            }
-            toutes_les_lignes.append(nouvelle_ligne)
-            print(f" Nouvelle carte ajoutée avec ID : {id_final}")
+                nouvelle_ligne = {
+                    "UID": uid,
+                    "Nom": nom,
+                    "Actif": str(actif),
+                    "Credits": str(credits),
+                    "Id": id_final,
+                    "Expiration": expiration,
+                    "Debut": debut, 
+                    "Fin": fin,
+                    "Jours": jours
+                    
+                }
+                toutes_les_lignes.append(nouvelle_ligne)
+                print(f" Nouvelle carte ajoutée avec ID : {id_final}")
 
-        succes = self._sauvegarder_donnees(toutes_les_lignes)
+            self._publier_donnees(toutes_les_lignes)
+        succes = self._attendre_sauvegarde()
         
         if succes:
             print(f"Carte {nom} enregistrée (ID: {id_final}, Credits: {credits})")
@@ -182,56 +513,84 @@ class GestionCartesCSV:
         else:
             return False, None
 
+    def importer_cartes(self, cartes):
+        """Provisionnement en masse : valide, alloue les Id et enregistre tout en une seule écriture.
+
+        Returns:
+            (nombre de cartes enregistrées, liste des erreurs (position, message))
+        """
+        valides = {}
+        erreurs = []
+        for position, donnees in enumerate(cartes, start=1):
+            try:
+                ligne = valider_ligne_carte(donnees)
+            except (ValueError, AttributeError) as e:
+                erreurs.append((position, str(e)))
+                continue
+            valides[ligne["UID"]] = ligne
+
+        if not valides:
+            return 0, erreurs
+
+        with self._verrou:
+            toutes_les_lignes = self._lire_toutes_les_donnees()
+            for ligne in toutes_les_lignes:
+                nouvelle = valides.pop(ligne.get("UID"), None)
+                if nouvelle is not None:
+                    nouvelle["Id"] = ligne.get("Id", "")
+                    ligne.update(nouvelle)
+                    valides[ligne["UID"]] = None
+            nouvelles = [ligne for ligne in valides.values() if ligne is not None]
+            for ligne, id_alloue in zip(nouvelles, self._allouer_ids(len(nouvelles))):
+                ligne["Id"] = id_alloue
+                toutes_les_lignes.append(ligne)
+
+            self._publier_donnees(toutes_les_lignes)
+        if not self._attendre_sauvegarde():
+            return 0, erreurs
+
+        print(f"[CSV] Import : {len(valides)} carte(s) enregistrée(s) ({len(nouvelles)} nouvelle(s)), "
+              f"{len(erreurs)} erreur(s).")
+        return len(valides), erreurs
+
+    def exporter_cartes(self, chemin=None):
+        """Retourne toutes les cartes ; les écrit aussi en CSV ou JSON si un chemin est donné."""
+        lignes = self._lire_toutes_les_donnees()
+        if chemin:
+            ecrire_cartes_exportees(lignes, chemin, self.colonnes)
+        return lignes
+
     def mettre_a_jour_credits(self, uid, nouveaux_credits):
-        toutes_les_lignes = self._lire_toutes_les_donnees()
-        
-        maj_effectuee = False
-        for ligne in toutes_les_lignes:
-            if ligne.get("UID") == uid:
-                ligne["Credits"] = str(nouveaux_credits)
-                maj_effectuee = True
-                break  
-        if maj_effectuee:
-            succes = self._sauvegarder_donnees(toutes_les_lignes)
-            if succes:
-                print(f"[CSV] Crédits mis à jour pour {uid}: {nouveaux_credits}")
-                return True
+        resultat = self._modifier_credits(uid, lambda _: int(nouveaux_credits))
+        if resultat is not None and resultat[1] is not None:
+            print(f"[CSV] Crédits mis à jour pour {uid}: {nouveaux_credits}")
+            return True
         
         print(f"[ERREUR] Carte {uid} non trouvée ou échec sauvegarde")
         return False
 
     def decrementer_un_credit(self, uid):
-        toutes_les_lignes = self._lire_toutes_les_donnees()
-        modification_faite = False
-        for ligne in toutes_les_lignes:
-            if ligne.get("UID") == uid:
-                try:
-                    credits_actuels = int(ligne.get("Credits", "0"))
-                except ValueError:
-                    credits_actuels = 0
-
-                if credits_actuels > 0:
-                    ligne["Credits"] = str(credits_actuels - 1)
-                    modification_faite = True
-                    print(f"[CSV] Décrémentation pour {uid} : {credits_actuels} -> {credits_actuels - 1}")
-                else:
-                    print(f"[CSV] Échec : Solde à 0 pour {uid}")
-                    return False
-                
-                break 
-        
-        if modification_faite:
-            return self._sauvegarder_donnees(toutes_les_lignes)
-        
-        return False
+        resultat = self._modifier_credits(uid, lambda credits: credits - 1 if credits > 0 else None)
+        if resultat is None:
+            return False
+
+        credits_actuels, nouveau_solde = resultat
+        if nouveau_solde is None:
+            print(f"[CSV] Échec : Solde à 0 pour {uid}")
+            return False
+        print(f"[CSV] Décrémentation pour {uid} : {credits_actuels} -> {nouveau_solde}")
+        return True
     
     def supprimer_carte(self, uid):
-        toutes_les_lignes = self._lire_toutes_les_donnees()
-        
-        lignes_restantes = [ligne for ligne in toutes_les_lignes if ligne.get("UID") != uid]
+        with self._verrou:
+            toutes_les_lignes = self._lire_toutes_les_donnees()
+            lignes_restantes = [ligne for ligne in toutes_les_lignes if ligne.get("UID") != uid]
+            trouvee = len(lignes_restantes) < len(toutes_les_lignes)
+            if trouvee:
+                self._publier_donnees(lignes_restantes)
 
-        if len(lignes_restantes) < len(toutes_les_lignes):
-            succes = self._sauvegarder_donnees(lignes_restantes)
+        if trouvee:
+            succes = self._attendre_sauvegarde()
             if succes:
                 print(f"[CSV] Carte {uid} supprimée de la base de données.")
                 return True
@@ -240,38 +599,29 @@ class GestionCartesCSV:
         return False
 
     def afficher_toutes_les_cartes(self):
-        lignes = self._lire_toutes_les_donnees()
-        
-        if not lignes:
-            print("\nAUCUNE CARTE ENREGISTRÉE.\n")
-            return
+        afficher_table_cartes(self._lire_toutes_les_donnees())
 
-        table_data = []
-        for ligne in lignes:
-            actif_visuel = "Oui" if str(ligne.get("Actif")).lower() == "true" else "Non"
-            
-            jours = ligne.get("Jours", "")
-            if not jours:
-                jours_visuel = "Tous"
-            else:
-                jours_visuel = jours
 
+if __name__ == "__main__":
+    import argparse
 
-            table_data.append([
-                ligne.get("Id", "?"),
-                ligne.get("Nom", "Inconnu"),
-                ligne.get("Credits", "0"),
-                actif_visuel,
-                ligne.get("Expiration", "-"),
-                f"{ligne.get('Debut','')} - {ligne.get('Fin','')}", 
-                jours_visuel,
-                ligne.get("UID", "")
-            ])
+    parser = argparse.ArgumentParser(description="Provisionnement en masse des cartes")
+    parser.add_argument("action", choices=["importer", "exporter"])
+    parser.add_argument("fichier", help="Fichier CSV ou JSON à importer / exporter")
+    parser.add_argument("--base", default="cartes_autorisees.csv",
+                        help="Table des cartes (.csv, ou .db pour le backend SQLite)")
+    arguments = parser.parse_args()
 
-        headers = ["ID", "Nom", "Crédits", "Actif","Expiration","Horaires","Jours", "UID "]
-        
-        print("\n" + "="*50)
-        print(" LISTE DES UTILISATEURS")
-        print("="*50)
-        print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
-        print("\n")
\ No newline at end of file
+    if arguments.base.endswith(".db"):
+        from cartes_sqlite import GestionCartesSQLite
+        gestion = GestionCartesSQLite(nom_fichier=arguments.base)
+    else:
+        gestion = GestionCartesCSV(nom_fichier=arguments.base, intervalle_compaction=None)
+
+    if arguments.action == "importer":
+        _, erreurs = gestion.importer_cartes(lire_cartes_a_importer(arguments.fichier))
+        for position, message in erreurs:
+            print(f"  Ligne {position} ignorée : {message}")
+    else:
+        print(f"{len(gestion.exporter_cartes(arguments.fichier))} carte(s) exportée(s) vers {arguments.fichier}")
+    gestion.fermer()
@@ -0,0 +1,336 @@
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+from cartes_autorisees import GestionCartesCSV, afficher_table_cartes, ecrire_cartes_exportees, valider_ligne_carte
+from decision_acces import carte_inconnue, evaluer_ligne, politique_de_ligne
+from filtre_uid import CacheNegatif, FiltreBloom
+from uid_carte import UidCarte
+
+# Les UidCarte sont stockés sous leur forme texte "1-2-3"
+sqlite3.register_adapter(UidCarte, str)
+
+
+class GestionCartesSQLite:
+    """Même API que GestionCartesCSV, stockée dans SQLite (WAL, index sur UID, mises à jour d'une seule ligne)."""
+
+    def __init__(self, nom_fichier="cartes_autorisees.db", ttl_cache_negatif=5.0):
+        self.nom_fichier = nom_fichier
+        self.colonnes = ["UID", "Nom", "Actif", "Credits", "Id", "Expiration", "Debut", "Fin", "Jours"]
+        self._verrou = threading.RLock()
+        # isolation_level=None : autocommit, les transactions sont ouvertes explicitement
+        self._connexion = sqlite3.connect(nom_fichier, check_same_thread=False, isolation_level=None)
+        self._connexion.row_factory = sqlite3.Row
+        self._cache_negatif = CacheNegatif(ttl=ttl_cache_negatif)
+        self._filtre = None
+        self._version_donnees = None
+        self._initialiser_base()
+        self._reconstruire_filtre()
+
+    def _initialiser_base(self):
+        with self._verrou:
+            self._connexion.execute("PRAGMA journal_mode=WAL")
+            self._connexion.execute("PRAGMA synchronous=NORMAL")
+            self._connexion.execute("PRAGMA busy_timeout=5000")
+            self._connexion.execute(
+                """CREATE TABLE IF NOT EXISTS cartes (
+                    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    UID TEXT NOT NULL,
+                    Nom TEXT NOT NULL DEFAULT '',
+                    Actif INTEGER NOT NULL DEFAULT 1,
+                    Credits INTEGER NOT NULL DEFAULT 0,
+                    Expiration TEXT NOT NULL DEFAULT '',
+                    Debut TEXT NOT NULL DEFAULT '',
+                    Fin TEXT NOT NULL DEFAULT '',
+                    Jours TEXT NOT NULL DEFAULT ''
+                )"""
+            )
+            self._connexion.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_cartes_uid ON cartes (UID)")
+
+    def _reconstruire_filtre(self):
+        with self._verrou:
+            uids = [row["UID"] for row in self._connexion.execute("SELECT UID FROM cartes")]
+            self._filtre = FiltreBloom.depuis_uids(uids)
+            self._version_donnees = self._connexion.execute("PRAGMA data_version").fetchone()[0]
+            self._cache_negatif.invalider()
+
+    def _filtre_a_jour(self):
+        # data_version change quand une autre connexion (admin, autre processus) a écrit
+        with self._verrou:
+            version = self._connexion.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._version_donnees:
+                self._reconstruire_filtre()
+            return self._filtre
+
+    @staticmethod
+    def _ligne_depuis_row(row):
+        # Même représentation texte que les lignes du CSV
+        return {
+            "UID": row["UID"],
+            "Nom": row["Nom"],
+            "Actif": str(bool(row["Actif"])),
+            "Credits": str(row["Credits"]),
+            "Id": str(row["Id"]),
+            "Expiration": row["Expiration"],
+            "Debut": row["Debut"],
+            "Fin": row["Fin"],
+            "Jours": row["Jours"],
+        }
+
+    @staticmethod
+    def _actif_vers_entier(actif):
+        return 1 if str(actif).strip().lower() == "true" else 0
+
+    def _obtenir_carte(self, uid):
+        with self._verrou:
+            row = self._connexion.execute("SELECT * FROM cartes WHERE UID = ?", (uid,)).fetchone()
+        return self._ligne_depuis_row(row) if row else None
+
+    def _lire_toutes_les_donnees(self):
+        with self._verrou:
+            rows = self._connexion.execute("SELECT * FROM cartes ORDER BY Id").fetchall()
+        return [self._ligne_depuis_row(row) for row in rows]
+
+    def evaluer_carte(self, uid_recherche):
+        # Carte inconnue : rejet par le cache négatif puis par le filtre de Bloom, sans requête
+        if self._cache_negatif.contient(uid_recherche):
+            return carte_inconnue(uid_recherche)
+        if uid_recherche not in self._filtre_a_jour():
+            self._cache_negatif.ajouter(uid_recherche)
+            return carte_inconnue(uid_recherche)
+        ligne = self._obtenir_carte(uid_recherche)
+        if ligne is None:
+            self._cache_negatif.ajouter(uid_recherche)
+            return carte_inconnue(uid_recherche)
+
+        # Comparaison en mémoire seulement : la désactivation est faite par le BalayeurExpiration
+        return evaluer_ligne(uid_recherche, ligne)
+
+    def verifier_carte(self, uid_recherche):
+        return self.evaluer_carte(uid_recherche).comme_tuple()
+
+    def desactiver_cartes_expirees(self, maintenant=None):
+        """Passe Actif=0 pour toutes les cartes expirées, en une seule transaction."""
+        if maintenant is None:
+            maintenant = datetime.now()
+        with self._verrou:
+            rows = self._connexion.execute(
+                "SELECT * FROM cartes WHERE Actif = 1 AND Expiration != ''"
+            ).fetchall()
+            expirees = []
+            for row in rows:
+                ligne = self._ligne_depuis_row(row)
+                if politique_de_ligne(ligne).evaluer(maintenant) == "expiree":
+                    print(f"[AUTO] Carte {ligne['Nom']} expirée le {ligne['Expiration']}. Désactivation...")
+                    expirees.append(ligne["UID"])
+            if expirees:
+                self._connexion.execute("BEGIN")
+                try:
+                    self._connexion.executemany(
+                        "UPDATE cartes SET Actif = 0 WHERE UID = ?", [(uid,) for uid in expirees]
+                    )
+                    self._connexion.execute("COMMIT")
+                except sqlite3.Error as e:
+                    self._connexion.execute("ROLLBACK")
+                    print(f"[ERREUR ECRITURE] {e}")
+                    return []
+            return expirees
+
+    def ajouter_ou_modifier_carte(self, uid, nom, actif, credits, expiration="", debut="", fin="", jours=""):
+        try:
+            with self._verrou:
+                existante = self._connexion.execute("SELECT Id FROM cartes WHERE UID = ?", (uid,)).fetchone()
+                valeurs = (nom, self._actif_vers_entier(actif), int(credits), expiration, debut, fin, jours)
+                if existante:
+                    self._connexion.execute(
+                        "UPDATE cartes SET Nom = ?, Actif = ?, Credits = ?, Expiration = ?, Debut = ?, Fin = ?, Jours = ? "
+                        "WHERE UID = ?",
+                        valeurs + (uid,),
+                    )
+                    id_final = str(existante["Id"])
+                else:
+                    curseur = self._connexion.execute(
+                        "INSERT INTO cartes (Nom, Actif, Credits, Expiration, Debut, Fin, Jours, UID) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        valeurs + (uid,),
+                    )
+                    id_final = str(curseur.lastrowid)
+                    self._filtre.ajouter(uid)
+                    self._cache_negatif.invalider(uid)
+                    print(f" Nouvelle carte ajoutée avec ID : {id_final}")
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[ERREUR ECRITURE] Impossible de sauvegarder : {e}")
+            return False, None
+
+        print(f"Carte {nom} enregistrée (ID: {id_final}, Credits: {credits})")
+        return True, id_final
+
+    def importer_cartes(self, cartes):
+        """Provisionnement en masse en une seule transaction ; les Id viennent de l'AUTOINCREMENT."""
+        valides = {}
+        erreurs = []
+        for position, donnees in enumerate(cartes, start=1):
+            try:
+                ligne = valider_ligne_carte(donnees)
+            except (ValueError, AttributeError) as e:
+                erreurs.append((position, str(e)))
+                continue
+            valides[ligne["UID"]] = ligne
+
+        if not valides:
+            return 0, erreurs
+
+        with self._verrou:
+            self._connexion.execute("BEGIN")
+            try:
+                self._connexion.executemany(
+                    "INSERT INTO cartes (UID, Nom, Actif, Credits, Expiration, Debut, Fin, Jours) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(UID) DO UPDATE SET Nom = excluded.Nom, Actif = excluded.Actif, "
+                    "Credits = excluded.Credits, Expiration = excluded.Expiration, "
+                    "Debut = excluded.Debut, Fin = excluded.Fin, Jours = excluded.Jours",
+                    [
+                        (ligne["UID"], ligne["Nom"], self._actif_vers_entier(ligne["Actif"]), int(ligne["Credits"]),
+                         ligne["Expiration"], ligne["Debut"], ligne["Fin"], ligne["Jours"])
+                        for ligne in valides.values()
+                    ],
+                )
+                self._connexion.execute("COMMIT")
+            except sqlite3.Error as e:
+                self._connexion.execute("ROLLBACK")
+                print(f"[ERREUR ECRITURE] Import annulé : {e}")
+                return 0, erreurs
+
+        self._reconstruire_filtre()
+        print(f"[SQLite] Import : {len(valides)} carte(s) enregistrée(s), {len(erreurs)} erreur(s).")
+        return len(valides), erreurs
+
+    def exporter_cartes(self, chemin=None):
+        lignes = self._lire_toutes_les_donnees()
+        if chemin:
+            ecrire_cartes_exportees(lignes, chemin, self.colonnes)
+        return lignes
+
+    def mettre_a_jour_credits(self, uid, nouveaux_credits):
+        try:
+            with self._verrou:
+                curseur = self._connexion.execute(
+                    "UPDATE cartes SET Credits = ? WHERE UID = ?", (int(nouveaux_credits), uid)
+                )
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[ERREUR ECRITURE] {e}")
+            return False
+
+        if curseur.rowcount:
+            print(f"[SQLite] Crédits mis à jour pour {uid}: {nouveaux_credits}")
+            return True
+        print(f"[ERREUR] Carte {uid} non trouvée ou échec sauvegarde")
+        return False
+
+    def decrementer_un_credit(self, uid):
+        with self._verrou:
+            curseur = self._connexion.execute(
+                "UPDATE cartes SET Credits = Credits - 1 WHERE UID = ? AND Credits > 0", (uid,)
+            )
+            if curseur.rowcount:
+                row = self._connexion.execute("SELECT Credits FROM cartes WHERE UID = ?", (uid,)).fetchone()
+                print(f"[SQLite] Décrémentation pour {uid} : {row['Credits'] + 1} -> {row['Credits']}")
+                return True
+
+        if self._obtenir_carte(uid) is not None:
+            print(f"[SQLite] Échec : Solde à 0 pour {uid}")
+        return False
+
+    def supprimer_carte(self, uid):
+        with self._verrou:
+            curseur = self._connexion.execute("DELETE FROM cartes WHERE UID = ?", (uid,))
+        if curseur.rowcount:
+            print(f"[SQLite] Carte {uid} supprimée de la base de données.")
+            return True
+
+        print(f"[SQLite] Carte {uid} introuvable ou erreur de sauvegarde.")
+        return False
+
+    def afficher_toutes_les_cartes(self):
+        afficher_table_cartes(self._lire_toutes_les_donnees())
+
+    def est_vide(self):
+        with self._verrou:
+            return self._connexion.execute("SELECT 1 FROM cartes LIMIT 1").fetchone() is None
+
+    def migrer_depuis_csv(self, fichier_csv):
+        """Import unique du CSV existant (ledger des crédits inclus), en une seule transaction."""
+        if not os.path.exists(fichier_csv):
+            print(f"[SQLite] Fichier {fichier_csv} introuvable, rien à migrer.")
+            return 0
+
+        source = GestionCartesCSV(nom_fichier=fichier_csv, intervalle_compaction=None)
+        try:
+            lignes = source._lire_toutes_les_donnees()
+        finally:
+            # Arrête le thread de commit groupé de la source, sans compacter : la source reste intacte
+            source.fermer(compacter=False)
+
+        requete = (
+            "INSERT INTO cartes (Id, UID, Nom, Actif, Credits, Expiration, Debut, Fin, Jours) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            # UID en double : la première ligne gagne, comme dans l'index de GestionCartesCSV
+            "ON CONFLICT(UID) DO NOTHING"
+        )
+        migrees = 0
+        with self._verrou:
+            self._connexion.execute("BEGIN")
+            try:
+                for ligne in lignes:
+                    id_csv = ligne.get("Id") or ""
+                    try:
+                        credits = int(ligne.get("Credits") or 0)
+                    except ValueError:
+                        credits = 0
+                    valeurs = (
+                        ligne.get("UID"),
+                        ligne.get("Nom") or "",
+                        self._actif_vers_entier(ligne.get("Actif")),
+                        credits,
+                        ligne.get("Expiration") or "",
+                        ligne.get("Debut") or "",
+                        ligne.get("Fin") or "",
+                        ligne.get("Jours") or "",
+                    )
+                    id_carte = int(id_csv) if id_csv.isdigit() else None
+                    try:
+                        curseur = self._connexion.execute(requete, (id_carte,) + valeurs)
+                    except sqlite3.IntegrityError:
+                        if id_carte is None:
+                            raise
+                        # Id en double dans le CSV : la carte reçoit un nouvel Id plutôt que
+                        # d'annuler toute la migration (et d'empêcher le lecteur de démarrer)
+                        print(f"[SQLite] Id {id_carte} en double pour la carte {ligne.get('UID')} : nouvel Id attribué.")
+                        curseur = self._connexion.execute(requete, (None,) + valeurs)
+                    if curseur.rowcount:
+                        migrees += 1
+                    else:
+                        print(f"[SQLite] UID {ligne.get('UID')} en double dans le CSV : ligne ignorée, la première est conservée.")
+                self._connexion.execute("COMMIT")
+            except Exception:
+                self._connexion.execute("ROLLBACK")
+                raise
+
+        self._reconstruire_filtre()
+        print(f"[SQLite] {migrees} carte(s) migrée(s) depuis {fichier_csv}.")
+        return migrees
+
+    def fermer(self):
+        with self._verrou:
+            self._connexion.close()
+
+
+if __name__ == "__main__":
+    # Migration unique : python cartes_sqlite.py cartes_autorisees.csv cartes_autorisees.db
+    fichier_csv = sys.argv[1] if len(sys.argv) > 1 else "cartes_autorisees.csv"
+    fichier_db = sys.argv[2] if len(sys.argv) > 2 else "cartes_autorisees.db"
+    gestion = GestionCartesSQLite(nom_fichier=fichier_db)
+    gestion.migrer_depuis_csv(fichier_csv)
+    gestion.fermer()
@@ -0,0 +1,160 @@
+from datetime import datetime
+from functools import lru_cache
+
+JOURS_NOMS = ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"]
+
+# Motifs courts pour l'écran LCD 16x2 (pas d'accents avec la charmap A00)
+MOTIFS_ECRAN = {
+    "accepte": "Acces accepte",
+    "inconnue": "Carte inconnue",
+    "desactivee": "Carte desactivee",
+    "expiree": "Carte expiree",
+    "jour": "Jour interdit",
+    "horaire": "Hors horaire",
+}
+
+
+class ResultatVerification:
+    """Décision unique prise pour un scan : une seule recherche dans la table des cartes."""
+
+    __slots__ = ("uid", "carte_connue", "autorise", "nom", "raison", "code_raison",
+                 "credits", "id_interne", "expiree")
+
+    def __init__(self, uid, carte_connue, autorise, nom, raison, code_raison,
+                 credits="0", id_interne="", expiree=False):
+        self.uid = uid
+        self.carte_connue = carte_connue
+        self.autorise = autorise
+        self.nom = nom
+        self.raison = raison
+        self.code_raison = code_raison
+        self.credits = credits
+        self.id_interne = id_interne
+        self.expiree = expiree
+
+    @property
+    def statut(self):
+        # Libellé écrit dans le journal et publié en MQTT
+        return "Accepte" if self.autorise else self.raison
+
+    @property
+    def motif_ecran(self):
+        return MOTIFS_ECRAN.get(self.code_raison, "Carte Invalide")
+
+    def comme_tuple(self):
+        # Format historique de GestionCartesCSV.verifier_carte
+        return self.autorise, self.nom, self.raison, self.credits, self.id_interne
+
+    def vers_dict(self):
+        return {champ: getattr(self, champ) for champ in self.__slots__}
+
+    @classmethod
+    def depuis_dict(cls, donnees):
+        return cls(**{champ: donnees.get(champ) for champ in cls.__slots__})
+
+
+def carte_inconnue(uid):
+    return ResultatVerification(uid, False, False, "Non renseigne",
+                                "Refusé - Carte inconnue", "inconnue")
+
+
+class PolitiqueAcces:
+    """Politique d'accès d'une carte compilée une seule fois (chargement ou modification)."""
+
+    __slots__ = ("actif", "expiration", "expiration_str", "jours_masque",
+                 "debut_us", "fin_us", "debut_str", "fin_str")
+
+    def __init__(self, actif, expiration_str="", jours="", debut_str="", fin_str=""):
+        self.actif = str(actif).strip().lower() == "true"
+        self.expiration_str = expiration_str
+        self.debut_str = debut_str
+        self.fin_str = fin_str
+
+        self.expiration = None
+        if expiration_str:
+            try:
+                self.expiration = datetime.strptime(expiration_str, "%Y-%m-%d")
+            except ValueError:
+                pass
+
+        # Bit n = jour n autorisé (0=lundi/6=dimanche) ; None = tous les jours
+        self.jours_masque = None
+        if jours:
+            self.jours_masque = 0
+            for jour in jours.split("-"):
+                if jour in ("0", "1", "2", "3", "4", "5", "6"):
+                    self.jours_masque |= 1 << int(jour)
+
+        # Fenêtre horaire en microsecondes depuis minuit ; None = 24h/24
+        self.debut_us = None
+        self.fin_us = None
+        if debut_str and fin_str:
+            try:
+                debut = datetime.strptime(debut_str, "%H:%M")
+                fin = datetime.strptime(fin_str, "%H:%M")
+                self.debut_us = (debut.hour * 60 + debut.minute) * 60_000_000
+                self.fin_us = (fin.hour * 60 + fin.minute) * 60_000_000
+            except ValueError:
+                pass
+
+    def evaluer(self, maintenant):
+        """Retourne le code de raison pour l'instant donné (une seule lecture d'horloge)."""
+        if not self.actif:
+            return "desactivee"
+        if self.expiration is not None and maintenant > self.expiration:
+            return "expiree"
+        if self.jours_masque is not None and not (self.jours_masque >> maintenant.weekday()) & 1:
+            return "jour"
+        if self.debut_us is not None:
+            instant = ((maintenant.hour * 60 + maintenant.minute) * 60 + maintenant.second) * 1_000_000 \
+                + maintenant.microsecond
+            if self.debut_us <= self.fin_us:
+                # Cas entre 08:00 et 16:00
+                acces_horaire = self.debut_us <= instant <= self.fin_us
+            else:
+                # Cas entre 22:00 et 06:00
+                acces_horaire = instant >= self.debut_us or instant <= self.fin_us
+            if not acces_horaire:
+                return "horaire"
+        return "accepte"
+
+    def raison(self, code, maintenant):
+        if code == "accepte":
+            return "Accepté"
+        if code == "desactivee":
+            return "Refusé (Désactivé)"
+        if code == "expiree":
+            return f"Refusé (Expiré le {self.expiration_str})"
+        if code == "jour":
+            return f"Refusé pour la journée du {JOURS_NOMS[maintenant.weekday()]}"
+        return f"Refusé (Horaire {self.debut_str}-{self.fin_str})"
+
+
+@lru_cache(maxsize=4096)
+def compiler_politique(actif, expiration_str, jours, debut_str, fin_str):
+    # Les cartes aux règles identiques partagent le même objet compilé
+    return PolitiqueAcces(actif, expiration_str, jours, debut_str, fin_str)
+
+
+def politique_de_ligne(ligne):
+    return compiler_politique(
+        str(ligne.get("Actif")),
+        ligne.get("Expiration") or "",
+        ligne.get("Jours") or "",
+        ligne.get("Debut") or "",
+        ligne.get("Fin") or "",
+    )
+
+
+def evaluer_ligne(uid, ligne, politique=None, maintenant=None):
+    """Applique la politique d'accès (actif, expiration, jours, horaire) à une ligne de carte."""
+    if politique is None:
+        politique = politique_de_ligne(ligne)
+    if maintenant is None:
+        maintenant = datetime.now()
+
+    code = politique.evaluer(maintenant)
+    return ResultatVerification(
+        uid, True, code == "accepte", ligne.get("Nom", "Inconnu"), politique.raison(code, maintenant), code,
+        ligne.get("Credits", "0"), ligne.get("Id", ""), expiree=code == "expiree",
+    )
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+
+
+def _fsync_dossier(chemin):
+    # Rend le renommage durable (entrée de répertoire) ; ignoré là où ce n'est pas supporté
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    try:
+        fd = os.open(dossier, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def ecrire_fichier_atomique(chemin, ecrire, binaire=False):
+    """Écrit via ecrire(fichier) dans un fichier temporaire fsyncé, puis le renomme sur `chemin`.
+
+    Une coupure de courant laisse soit l'ancien fichier complet, soit le nouveau.
+    """
+    temporaire = f"{chemin}.tmp"
+    if binaire:
+        fichier = open(temporaire, "wb")
+    else:
+        fichier = open(temporaire, "w", newline="", encoding="utf-8")
+    try:
+        with fichier:
+            ecrire(fichier)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        os.replace(temporaire, chemin)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+    _fsync_dossier(chemin)
+
+
+class GroupeCommit:
+    """Regroupe les sauvegardes demandées dans une courte fenêtre en une seule écriture durable.
+
+    soumettre() bloque jusqu'à ce qu'une écriture commencée après la demande soit terminée.
+    ecrire() doit écrire l'état courant (le plus récent) et retourner True en cas de succès.
+    """
+
+    def __init__(self, ecrire, fenetre=0.05, nom="CSV"):
+        self._ecrire = ecrire
+        self.fenetre = fenetre
+        self.nom = nom
+        self._condition = threading.Condition()
+        self._demande = 0
+        self._termine = 0
+        self._dernier_succes = True
+        self._arret = False
+        self.nb_ecritures = 0
+        self.nb_mises_a_jour = 0
+        self.derniere_latence_ms = 0.0
+        self.latence_max_ms = 0.0
+        self.dernier_regroupement = 0
+        self._thread = threading.Thread(target=self._boucle, daemon=True)
+        self._thread.start()
+
+    def en_attente(self):
+        return self._demande != self._termine
+
+    def soumettre(self):
+        with self._condition:
+            self._demande += 1
+            numero = self._demande
+            self._condition.notify_all()
+            while self._termine < numero:
+                if self._arret and not self._thread.is_alive():
+                    return False
+                self._condition.wait(0.5)
+            return self._dernier_succes
+
+    def _boucle(self):
+        while True:
+            with self._condition:
+                while self._demande == self._termine and not self._arret:
+                    self._condition.wait()
+                if self._demande == self._termine and self._arret:
+                    return
+            # Laisse les mises à jour voisines rejoindre cette écriture
+            time.sleep(self.fenetre)
+            with self._condition:
+                cible = self._demande
+                regroupees = cible - self._termine
+
+            debut = time.perf_counter()
+            try:
+                succes = self._ecrire()
+            except Exception as e:
+                print(f"[ERREUR ECRITURE] {self.nom} : {e}")
+                succes = False
+            latence_ms = (time.perf_counter() - debut) * 1000
+
+            with self._condition:
+                self._termine = cible
+                self._dernier_succes = succes
+                self.nb_ecritures += 1
+                self.nb_mises_a_jour += regroupees
+                self.derniere_latence_ms = latence_ms
+                self.latence_max_ms = max(self.latence_max_ms, latence_ms)
+                self.dernier_regroupement = regroupees
+                self._condition.notify_all()
+            if succes:
+                print(f"[{self.nom}] Sauvegarde durable : {regroupees} mise(s) à jour en {latence_ms:.1f} ms")
+
+    def statistiques(self):
+        with self._condition:
+            return {
+                "ecritures": self.nb_ecritures,
+                "mises_a_jour": self.nb_mises_a_jour,
+                "mises_a_jour_par_ecriture": (self.nb_mises_a_jour / self.nb_ecritures) if self.nb_ecritures else 0.0,
+                "dernier_regroupement": self.dernier_regroupement,
+                "derniere_latence_ms": self.derniere_latence_ms,
+                "latence_max_ms": self.latence_max_ms,
+            }
+
+    def arreter(self):
+        with self._condition:
+            self._arret = True
+            self._condition.notify_all()
+        self._thread.join(timeout=5)
@@ -0,0 +1,187 @@
+import json
+import struct
+import zlib
+
+from evenement_acces import TYPES_ACCES
+from historique_binaire import date_vers_horodatage, horodatage_vers_date
+from uid_carte import UidCarte
+
+# Encodages des événements publiés sur MQTT, choisis par configuration (MqttPublisher(encodage=...)).
+# Le consommateur n'a pas besoin de connaître le choix : decoder_charge() reconnaît la charge
+# à son premier octet ("{" ou "[" pour JSON, numéro de version pour une trame binaire).
+ENCODAGE_JSON = "json"
+ENCODAGE_BINAIRE = "binaire"
+ENCODAGE_BINAIRE_ZLIB = "binaire_zlib"
+ENCODAGES = (ENCODAGE_JSON, ENCODAGE_BINAIRE, ENCODAGE_BINAIRE_ZLIB)
+
+# Trame binaire : en-tête (version du schéma, drapeaux, nombre d'événements) puis les
+# enregistrements, compressés ensemble par zlib si DRAPEAU_ZLIB est levé.
+VERSION_TRAME = 1
+DRAPEAU_ZLIB = 0x01
+EN_TETE_TRAME = struct.Struct("<BBH")
+
+# Enregistrement : partie fixe, puis l'UID (octets bruts) et les chaînes préfixées par leur longueur
+# sequence, horodatage, type d'accès, crédits avant/après, latence (dixièmes de ms), longueur UID
+PARTIE_FIXE = struct.Struct("<IIBhhHB")
+CHAINES = ("lecteur", "type_carte", "nom", "statut", "raison")
+CREDITS_ABSENTS = -32768
+LATENCE_ABSENTE = 0xFFFF
+
+
+def _credits_vers_entier(valeur):
+    # Tolérant comme evenement_acces._entier : "" ou une valeur non numérique = crédits absents
+    if valeur is None or valeur == "":
+        return CREDITS_ABSENTS
+    try:
+        valeur = int(valeur)
+    except (TypeError, ValueError):
+        return CREDITS_ABSENTS
+    return max(-32767, min(32767, valeur))
+
+
+def _latence_vers_entier(valeur):
+    # Dixièmes de ms saturés dans [0, LATENCE_ABSENTE - 1] : une latence négative (horloge
+    # ajustée) ou énorme ne doit pas rendre l'événement impossible à encoder
+    if valeur is None or valeur == "":
+        return LATENCE_ABSENTE
+    try:
+        dixiemes = int(round(float(valeur) * 10))
+    except (TypeError, ValueError, OverflowError):
+        return LATENCE_ABSENTE
+    return max(0, min(LATENCE_ABSENTE - 1, dixiemes))
+
+
+def _borner(valeur, maximum):
+    return max(0, min(maximum, valeur))
+
+
+def _entier_vers_credits(valeur):
+    return None if valeur == CREDITS_ABSENTS else valeur
+
+
+class EncodeurJson:
+    """Format historique : un objet JSON par événement, un tableau pour un lot."""
+
+    nom = ENCODAGE_JSON
+
+    def encoder(self, message):
+        return json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+    def assembler(self, enregistrements, lot=True):
+        if not lot and len(enregistrements) == 1:
+            return enregistrements[0]
+        return b"[" + b",".join(enregistrements) + b"]"
+
+
+class EncodeurBinaire:
+    """Enregistrements struct compacts dans une trame versionnée, compressée ou non (zlib)."""
+
+    def __init__(self, compression=False, niveau=6):
+        self.nom = ENCODAGE_BINAIRE_ZLIB if compression else ENCODAGE_BINAIRE
+        self.compression = compression
+        self.niveau = niveau
+
+    def encoder(self, message):
+        try:
+            uid = UidCarte.depuis_texte(message.get("uid", "")).octets[:255]
+        except ValueError:
+            uid = b""
+        try:
+            # Champ non signé de 32 bits : une date hors de [1970, 2106] est saturée
+            horodatage = _borner(date_vers_horodatage(message.get("date_heure", "")), 0xFFFFFFFF)
+        except (TypeError, ValueError, OverflowError):
+            horodatage = 0
+        try:
+            sequence = int(message.get("sequence") or 0) & 0xFFFFFFFF
+        except (TypeError, ValueError):
+            sequence = 0
+        type_acces = message.get("type_acces")
+        morceaux = [
+            PARTIE_FIXE.pack(
+                sequence,
+                horodatage,
+                TYPES_ACCES.index(type_acces) if type_acces in TYPES_ACCES else 255,
+                _credits_vers_entier(message.get("credits_avant")),
+                _credits_vers_entier(message.get("credits_apres")),
+                _latence_vers_entier(message.get("latence_ms")),
+                len(uid),
+            ),
+            uid,
+        ]
+        for champ in CHAINES:
+            texte = str(message.get(champ) or "").encode("utf-8")[:255]
+            morceaux.append(bytes((len(texte),)))
+            morceaux.append(texte)
+        return b"".join(morceaux)
+
+    def assembler(self, enregistrements, lot=True):
+        corps = b"".join(enregistrements)
+        drapeaux = 0
+        if self.compression:
+            compresse = zlib.compress(corps, self.niveau)
+            # Un événement isolé se compresse mal : on ne garde zlib que s'il fait gagner des octets
+            if len(compresse) < len(corps):
+                corps = compresse
+                drapeaux |= DRAPEAU_ZLIB
+        return EN_TETE_TRAME.pack(VERSION_TRAME, drapeaux, len(enregistrements)) + corps
+
+
+def creer_encodeur(encodage=ENCODAGE_JSON):
+    if encodage == ENCODAGE_JSON:
+        return EncodeurJson()
+    if encodage == ENCODAGE_BINAIRE:
+        return EncodeurBinaire()
+    if encodage == ENCODAGE_BINAIRE_ZLIB:
+        return EncodeurBinaire(compression=True)
+    raise ValueError(f"Encodage MQTT inconnu : {encodage} (attendu : {', '.join(ENCODAGES)})")
+
+
+def _decoder_enregistrement(donnees, position):
+    (sequence, horodatage, code, credits_avant, credits_apres, latence,
+     longueur_uid) = PARTIE_FIXE.unpack_from(donnees, position)
+    position += PARTIE_FIXE.size
+    uid = UidCarte(donnees[position:position + longueur_uid]).texte
+    position += longueur_uid
+    message = {
+        "date_heure": horodatage_vers_date(horodatage),
+        "uid": uid,
+        "credits_avant": _entier_vers_credits(credits_avant),
+        "credits_apres": _entier_vers_credits(credits_apres),
+        "latence_ms": None if latence == LATENCE_ABSENTE else latence / 10,
+        "sequence": sequence,
+        "type_acces": TYPES_ACCES[code] if code < len(TYPES_ACCES) else "indetermine",
+    }
+    for champ in CHAINES:
+        longueur = donnees[position]
+        message[champ] = donnees[position + 1:position + 1 + longueur].decode("utf-8", errors="replace")
+        position += 1 + longueur
+    return message, position
+
+
+def decoder_charge(charge):
+    """Liste des événements (dicts) d'une charge MQTT, quel que soit l'encodage ; ValueError sinon."""
+    if not charge:
+        raise ValueError("Charge vide")
+    if charge[:1] in (b"{", b"["):
+        donnees = json.loads(charge.decode("utf-8"))
+        return donnees if isinstance(donnees, list) else [donnees]
+    if len(charge) < EN_TETE_TRAME.size:
+        raise ValueError("Trame binaire tronquée")
+    version, drapeaux, nombre = EN_TETE_TRAME.unpack_from(charge)
+    if version != VERSION_TRAME:
+        raise ValueError(f"Version de trame inconnue : {version}")
+    corps = charge[EN_TETE_TRAME.size:]
+    if drapeaux & DRAPEAU_ZLIB:
+        try:
+            corps = zlib.decompress(corps)
+        except zlib.error as e:
+            raise ValueError(f"Trame zlib invalide : {e}") from e
+    evenements = []
+    position = 0
+    try:
+        for _ in range(nombre):
+            message, position = _decoder_enregistrement(corps, position)
+            evenements.append(message)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Trame binaire tronquée : {e}") from e
+    return evenements
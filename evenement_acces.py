@@ -0,0 +1,225 @@
+import argparse
+import csv
+import gzip
+import io
+import os
+import shutil
+from functools import lru_cache
+
+from ecriture_atomique import ecrire_fichier_atomique
+
+# Schéma unique des événements d'accès (historique_acces.csv), écrit par JournalRFID seulement.
+# La première colonne porte la version : un lecteur reconnaît une ligne sans deviner le format.
+VERSION_SCHEMA = "2"
+COLONNES_EVENEMENT = [
+    "Version", "Date/Heure", "Lecteur", "UID", "Type de carte", "Nom",
+    "Statut", "Raison", "Credits avant", "Credits apres", "Latence ms",
+]
+NB_COLONNES = len(COLONNES_EVENEMENT)
+
+TYPES_ACCES = ['autorise', 'refuse', 'alerte', 'desactive', 'indetermine']
+
+
+def _entier(valeur):
+    if valeur is None or valeur == "":
+        return None
+    try:
+        return int(valeur)
+    except ValueError:
+        return None
+
+
+def _decimal(valeur):
+    if valeur is None or valeur == "":
+        return None
+    try:
+        return float(valeur)
+    except ValueError:
+        return None
+
+
+def _texte(valeur):
+    return "" if valeur is None else str(valeur)
+
+
+class EvenementAcces:
+    """Un passage de carte tel qu'enregistré dans l'historique (schéma version 2)."""
+
+    __slots__ = ("date_heure", "lecteur", "uid", "type_carte", "nom", "statut",
+                 "raison", "credits_avant", "credits_apres", "latence_ms")
+
+    def __init__(self, date_heure, uid, nom, statut, lecteur="", type_carte="", raison="",
+                 credits_avant=None, credits_apres=None, latence_ms=None):
+        self.date_heure = date_heure
+        self.lecteur = lecteur
+        self.uid = uid
+        self.type_carte = type_carte
+        self.nom = nom
+        self.statut = statut
+        self.raison = raison
+        self.credits_avant = credits_avant
+        self.credits_apres = credits_apres
+        self.latence_ms = latence_ms
+
+    def vers_ligne(self):
+        latence = "" if self.latence_ms is None else f"{self.latence_ms:.1f}"
+        return [
+            VERSION_SCHEMA, self.date_heure, _texte(self.lecteur), _texte(self.uid),
+            _texte(self.type_carte), _texte(self.nom), _texte(self.statut), _texte(self.raison),
+            _texte(self.credits_avant), _texte(self.credits_apres), latence,
+        ]
+
+    @classmethod
+    def depuis_ligne(cls, champs):
+        """Parseur rapide d'une ligne au schéma courant (positions fixes, pas de détection)."""
+        return cls(
+            date_heure=champs[1], lecteur=champs[2], uid=champs[3], type_carte=champs[4],
+            nom=champs[5], statut=champs[6], raison=champs[7],
+            credits_avant=_entier(champs[8]), credits_apres=_entier(champs[9]),
+            latence_ms=_decimal(champs[10]),
+        )
+
+    def vers_dict(self):
+        return {nom: getattr(self, nom) for nom in self.__slots__}
+
+
+@lru_cache(maxsize=None)
+def classifier_statut(statut: str) -> str:
+    """Type d'acces d'un statut ; calcule une seule fois par statut distinct."""
+    statut_lower = statut.lower()
+    
+    if any(mot in statut_lower for mot in ['accepte', 'autorise', 'valide', 'succes']):
+        return 'autorise'
+    elif any(mot in statut_lower for mot in ['desactive', 'carte desactivee']):
+        return 'desactive'
+    elif any(mot in statut_lower for mot in ['alerte', 'suspicieux', 'tentative', 'illegitime']):
+        return 'alerte'
+    elif any(mot in statut_lower for mot in ['refuse', 'refus', 'non autorise', 'invalide']):
+        return 'refuse'
+    else:
+        return 'indetermine'
+
+
+def _ressemble_a_une_date(valeur):
+    # "2025-11-28 11:27:19" ; un UID "211-183-..." n'a pas de tiret en 5e position
+    return len(valeur) >= 10 and valeur[:4].isdigit() and valeur[4] == "-"
+
+
+def evenement_depuis_ancienne_ligne(champs):
+    """Reconnaît une ligne de n'importe quel format passé ; None pour un en-tête ou une ligne vide.
+
+    - schéma 2 :           Version,Date/Heure,Lecteur,UID,Type de carte,Nom,Statut,...
+    - JournalRFID :        Date/Heure,UID,Nom,Statut
+    - verification.py :    UID,Nom,Date,Statut
+    - journal_rfid.csv :   Date/Heure,Type de carte,UID,Nom,Statut
+    """
+    champs = [champ.strip() for champ in champs]
+    if len(champs) < 4 or champs[0] in ("Version", "Date/Heure", "UID"):
+        return None
+    if champs[0] == VERSION_SCHEMA and len(champs) >= NB_COLONNES:
+        return EvenementAcces.depuis_ligne(champs)
+    if len(champs) >= 5 and _ressemble_a_une_date(champs[0]):
+        date_heure, type_carte, uid, nom, statut = champs[:5]
+        return EvenementAcces(date_heure, uid, nom, statut, type_carte=type_carte)
+    if _ressemble_a_une_date(champs[0]):
+        date_heure, uid, nom, statut = champs[:4]
+        return EvenementAcces(date_heure, uid, nom, statut)
+    if _ressemble_a_une_date(champs[2]):
+        uid, nom, date_heure, statut = champs[:4]
+        return EvenementAcces(date_heure, uid, nom, statut)
+    return None
+
+
+def est_au_schema_courant(chemin):
+    """True si le fichier commence par l'en-tête du schéma courant (ou est vide/absent)."""
+    try:
+        with open(chemin, "r", newline="", encoding="utf-8") as fichier:
+            premiere_ligne = fichier.readline()
+    except OSError:
+        return True
+    if not premiere_ligne.strip():
+        return True
+    return next(csv.reader([premiere_ligne]), []) == COLONNES_EVENEMENT
+
+
+def lire_evenements(chemin):
+    """Itère les événements d'un historique (ou d'un segment compressé .gz).
+
+    Fichier au schéma courant : parseur à positions fixes. Sinon (fichier pas encore
+    converti), chaque ligne passe par la détection de format.
+    """
+    ouvrir = gzip.open if chemin.endswith(".gz") else open
+    with ouvrir(chemin, "rt", newline="", encoding="utf-8") as fichier:
+        premiere_ligne = fichier.readline()
+        en_tete = next(csv.reader([premiere_ligne]), [])
+        if en_tete == COLONNES_EVENEMENT:
+            for champs in csv.reader(fichier):
+                if len(champs) >= NB_COLONNES:
+                    yield EvenementAcces.depuis_ligne(champs)
+            return
+
+        fichier.seek(0)
+        for champs in csv.reader(fichier):
+            evenement = evenement_depuis_ancienne_ligne(champs)
+            if evenement is not None:
+                yield evenement
+
+
+def lire_evenements_depuis(chemin, position=0):
+    """Lit les événements ajoutés après l'octet `position`.
+
+    Retourne (evenements, nouvelle_position). Seules les lignes complètes sont consommées :
+    une ligne en cours d'écriture par le journal sera lue à l'appel suivant.
+    """
+    with open(chemin, "rb") as fichier:
+        en_tete = fichier.readline()
+        if not en_tete.endswith(b"\n"):
+            return [], position
+        schema_courant = next(csv.reader([en_tete.decode("utf-8")]), []) == COLONNES_EVENEMENT
+        if schema_courant:
+            position = max(position, len(en_tete))
+        fichier.seek(position)
+        donnees = fichier.read()
+
+    fin = donnees.rfind(b"\n")
+    if fin < 0:
+        return [], position
+    lecteur = csv.reader(io.StringIO(donnees[:fin + 1].decode("utf-8"), newline=""))
+    if schema_courant:
+        evenements = [EvenementAcces.depuis_ligne(champs) for champs in lecteur if len(champs) >= NB_COLONNES]
+    else:
+        evenements = [evenement for evenement in map(evenement_depuis_ancienne_ligne, lecteur)
+                      if evenement is not None]
+    return evenements, position + fin + 1
+
+
+def convertir_historique(chemin, sauvegarde=True):
+    """Conversion unique d'un historique ancien format vers le schéma courant.
+
+    L'original est conservé dans <chemin>.ancien ; la réécriture est atomique.
+    Retourne le nombre d'événements écrits, ou 0 si le fichier était déjà à jour.
+    """
+    if not os.path.exists(chemin) or est_au_schema_courant(chemin):
+        return 0
+
+    evenements = list(lire_evenements(chemin))
+    if sauvegarde:
+        shutil.copy2(chemin, chemin + ".ancien")
+
+    def ecrire(fichier):
+        writer = csv.writer(fichier)
+        writer.writerow(COLONNES_EVENEMENT)
+        writer.writerows(evenement.vers_ligne() for evenement in evenements)
+
+    ecrire_fichier_atomique(chemin, ecrire)
+    print(f"[HISTORIQUE] {chemin} converti au schéma v{VERSION_SCHEMA} ({len(evenements)} événement(s)).")
+    return len(evenements)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convertit un historique d'accès vers le schéma courant")
+    parser.add_argument("fichiers", nargs="+", help="Historiques CSV à convertir")
+    parser.add_argument("--sans-sauvegarde", action="store_true", help="Ne pas garder de copie .ancien")
+    arguments = parser.parse_args()
+    for chemin in arguments.fichiers:
+        convertir_historique(chemin, sauvegarde=not arguments.sans_sauvegarde)
@@ -0,0 +1,69 @@
+import hashlib
+import math
+import time
+
+
+class FiltreBloom:
+    """Filtre de Bloom sur les UID connus : un UID absent est rejeté sans consulter la table.
+
+    Pas de faux négatifs ; les faux positifs (et les cartes supprimées) passent simplement
+    à la recherche normale.
+    """
+
+    def __init__(self, capacite=1000, taux_faux_positifs=0.01):
+        capacite = max(capacite, 1)
+        self.nb_bits = max(64, int(-capacite * math.log(taux_faux_positifs) / (math.log(2) ** 2)))
+        self.nb_hachages = max(1, round(self.nb_bits / capacite * math.log(2)))
+        self._bits = bytearray((self.nb_bits + 7) // 8)
+
+    @classmethod
+    def depuis_uids(cls, uids, taux_faux_positifs=0.01):
+        uids = list(uids)
+        filtre = cls(capacite=max(len(uids) * 2, 1000), taux_faux_positifs=taux_faux_positifs)
+        for uid in uids:
+            filtre.ajouter(uid)
+        return filtre
+
+    def _positions(self, uid):
+        # Double hachage (Kirsch-Mitzenmacher) à partir d'un seul condensé
+        condense = hashlib.blake2b(str(uid).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(condense[:8], "little")
+        h2 = int.from_bytes(condense[8:], "little") | 1
+        return ((h1 + i * h2) % self.nb_bits for i in range(self.nb_hachages))
+
+    def ajouter(self, uid):
+        for position in self._positions(uid):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, uid):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(uid))
+
+
+class CacheNegatif:
+    """UID inconnus récemment vus : les essais répétés d'une carte intruse ne coûtent plus de recherche."""
+
+    def __init__(self, ttl=5.0, taille_max=1024):
+        self.ttl = ttl
+        self.taille_max = taille_max
+        self._expirations = {}
+
+    def contient(self, uid):
+        expiration = self._expirations.get(uid)
+        if expiration is None:
+            return False
+        if time.monotonic() >= expiration:
+            self._expirations.pop(uid, None)
+            return False
+        return True
+
+    def ajouter(self, uid):
+        if uid not in self._expirations and len(self._expirations) >= self.taille_max:
+            # On retire l'entrée la plus ancienne (les dict gardent l'ordre d'insertion)
+            self._expirations.pop(next(iter(self._expirations), None), None)
+        self._expirations[uid] = time.monotonic() + self.ttl
+
+    def invalider(self, uid=None):
+        if uid is None:
+            self._expirations.clear()
+        else:
+            self._expirations.pop(uid, None)
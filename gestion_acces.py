@@ -38,7 +38,7 @@ class GestionAcces:
         for t in threads:
             t.join()
 
-    def carte_refusee(self):
+    def carte_refusee(self, motif="Carte Invalide"):
         threads = []
 
         # 1. LED Rouge (2 secondes)
@@ -55,7 +55,7 @@ class GestionAcces:
                 target=self.ecran.afficher,
                 kwargs={
                     "ligne1": "ACCES REFUSE", 
-                    "ligne2": "Carte Invalide", 
+                    "ligne2": motif[:16], 
                     "duree": 4  # C'est ici que le 4 secondes est géré
                 }
             )
@@ -1,88 +1,129 @@
+import argparse
 import csv
 import json
 import os
 import sys
-from typing import List, Dict, Optional
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain, islice
+from typing import Dict, Iterator, List, Optional
 from tabulate import tabulate
 
+from agregats_acces import AgregatsAcces
+from evenement_acces import TYPES_ACCES, classifier_statut, lire_evenements, lire_evenements_depuis
+from index_temporel import lire_periode
+from rotation_historique import ManifesteSegments
+
+
 class HistoriqueDesAcces:
     def __init__(self):
         self.fichier_historique = "historique_acces.csv"
         self.fichier_cartes = "cartes_autorisees.csv"
+        # Suivi incrémental : on ne relit que ce qui a été ajouté depuis le dernier chargement
+        self._inode_historique = None
+        self._position_historique = 0
+        self._signature_cartes = None
+        self.entrees_historique = []
+        # Index UID -> positions dans entrees_historique (historique d'un badge sans tout parcourir)
+        self._postings_uid = defaultdict(list)
+        # Segments archives analyses une seule fois (ils ne changent plus) :
+        # (fichier, octets) -> (entrees, index UID -> positions)
+        self._cache_segments = {}
         self.cartes_autorisees = self._charger_cartes_autorisees()
-        self.entrees_historique = self._charger_historique()
+        # Chargement paresseux : une requete par periode (CLI --from/--to) passe par l'index
+        # temporel et les segments sans analyser tout le fichier courant
+        self._historique_charge = False
+        self._verifier_historique()
     
     def recharger(self):
-        """Recharge les fichiers pour obtenir les données les plus récentes."""
-        self.cartes_autorisees = self._charger_cartes_autorisees()
+        """Met à jour les données : seules les nouvelles lignes de l'historique sont lues."""
+        signature = self._signature(self.fichier_cartes)
+        if signature != self._signature_cartes:
+            self.cartes_autorisees = self._charger_cartes_autorisees()
+            # Noms et statuts déduits des cartes : on reconstruit tout (rare)
+            self._inode_historique = None
+            self._cache_segments = {}
         self.entrees_historique = self._charger_historique()
 
+    @staticmethod
+    def _signature(chemin):
+        try:
+            stat = os.stat(chemin)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
     def _charger_cartes_autorisees(self) -> Dict:
         if not os.path.exists(self.fichier_cartes):
             print(f"Le fichier {self.fichier_cartes} n'existe pas")
             sys.exit(1)
         
+        self._signature_cartes = self._signature(self.fichier_cartes)
         try:
-            with open(self.fichier_cartes, 'r') as fichier:
-                data = json.load(fichier)
+            with open(self.fichier_cartes, 'r', encoding='utf-8') as fichier:
                 resultat = {}
-                for carte in data.get('cartes', []):
-                    uid = carte.get('uid')
+                if self.fichier_cartes.lower().endswith('.json'):
+                    cartes = ({'UID': carte.get('uid'), 'Nom': carte.get('nom'), 'Actif': carte.get('actif')}
+                              for carte in json.load(fichier).get('cartes', []))
+                else:
+                    cartes = csv.DictReader(fichier)
+                for carte in cartes:
+                    uid = carte.get('UID')
                     if uid:
                         resultat[uid] = {
-                            'nom': carte.get('nom', 'Inconnu'),
-                            'actif': carte.get('actif', False)
+                            'nom': carte.get('Nom') or 'Inconnu',
+                            'actif': str(carte.get('Actif')).strip().lower() in ('true', '1', 'oui')
                         }
                 return resultat
         except Exception as exception:
             print(f"Erreur lors du chargement des cartes: {exception}")
             return {}
     
-    def _charger_historique(self) -> List[Dict]:
+    def _verifier_historique(self):
         if not os.path.exists(self.fichier_historique):
             print(f"Le fichier {self.fichier_historique} n'existe pas.")
             sys.exit(1)
+
+    def _entrees_courantes(self) -> List[Dict]:
+        """Entrees du fichier courant, chargees au premier besoin (vue du menu, recherche par UID)."""
+        if not self._historique_charge:
+            self.recharger()
+        return self.entrees_historique
+
+    def _charger_historique(self) -> List[Dict]:
+        self._verifier_historique()
+        self._historique_charge = True
         
         try:
-            with open(self.fichier_historique, 'r', newline='') as fichier:
-                premiere_ligne = fichier.readline().strip()
-                fichier.seek(0) # Retour au début du fichier
-                
-                entrees_historique = []
-                
-                if 'Date/Heure' in premiere_ligne:
-                    reader = csv.DictReader(fichier)
-                    for ligne in reader:
-                        entree = self._parser_ligne(ligne)
-                        if entree:
-                            entrees_historique.append(entree)
-                else:
-                    reader = csv.reader(fichier)
-                    for ligne in reader:
-                        if len(ligne) < 4:
-                            continue
-                        ligne_dict = {
-                            'UID': ligne[0].strip(),
-                            'Nom': ligne[1].strip(),
-                            'Date/Heure': ligne[2].strip(),
-                            'Statut': ligne[3].strip(),
-                            'Type de carte': 'Inconnu',
-                        }
-                        entree = self._parser_ligne(ligne_dict)
-                        if entree:
-                            entrees_historique.append(entree)
-                
-                return entrees_historique
+            stat = os.stat(self.fichier_historique)
+            # Fichier remplacé (rotation, conversion) ou tronqué : rechargement complet
+            if stat.st_ino != self._inode_historique or stat.st_size < self._position_historique:
+                self._inode_historique = stat.st_ino
+                self._position_historique = 0
+                self.entrees_historique = []
+                self._postings_uid = defaultdict(list)
+            elif stat.st_size == self._position_historique:
+                return self.entrees_historique
+
+            evenements, self._position_historique = lire_evenements_depuis(
+                self.fichier_historique, self._position_historique
+            )
+            for evenement in evenements:
+                entree = self._parser_ligne(evenement.vers_dict())
+                if entree:
+                    self._postings_uid[entree['uid']].append(len(self.entrees_historique))
+                    self.entrees_historique.append(entree)
+            return self.entrees_historique
         except Exception as exception:
             print(f"Erreur lors de la lecture du fichier: {exception}")
             sys.exit(1)
     
     def _parser_ligne(self, ligne: Dict) -> Optional[Dict]:
-        date_heure = ligne.get('Date/Heure')
-        uid = ligne.get('UID')
-        type_carte = ligne.get('Type de carte')
-        nom = ligne.get('Nom')
-        statut = ligne.get('Statut')
+        date_heure = ligne.get('date_heure')
+        uid = ligne.get('uid')
+        type_carte = ligne.get('type_carte')
+        nom = ligne.get('nom')
+        statut = ligne.get('statut')
         
         if not date_heure or not uid:
             return None
@@ -106,36 +147,26 @@ class HistoriqueDesAcces:
             'uid': uid,
             'type_carte': type_carte or 'Inconnu',
             'nom': nom,
-            'statut': statut
+            'statut': statut,
+            'type_acces': classifier_statut(statut),
+            'lecteur': ligne.get('lecteur') or '',
+            'raison': ligne.get('raison') or '',
+            'credits_avant': ligne.get('credits_avant'),
+            'credits_apres': ligne.get('credits_apres'),
+            'latence_ms': ligne.get('latence_ms'),
         }
     
     def _determiner_type_acces(self, statut: str) -> str:
-        statut_lower = statut.lower()
-        
-        if any(mot in statut_lower for mot in ['accepte', 'autorise', 'valide', 'succes']):
-            return 'autorise'
-        elif any(mot in statut_lower for mot in ['desactive', 'carte desactivee']):
-            return 'desactive'
-        elif any(mot in statut_lower for mot in ['alerte', 'suspicieux', 'tentative', 'illegitime']):
-            return 'alerte'
-        elif any(mot in statut_lower for mot in ['refuse', 'refus', 'non autorise', 'invalide']):
-            return 'refuse'
-        else:
-            return 'indetermine'
+        return classifier_statut(statut)
     
-    def afficher_historique(self):
-        if not self.entrees_historique:
-            print("Erreur: Aucune entree dans l'historique.")
-            sys.exit(1)
-        
-        # En-tete
-        print("\n" + "=" * 100)
-        print("HISTORIQUE DES ACCES")
-        print("=" * 100)
+    def _toutes_les_entrees(self) -> Iterator[Dict]:
+        """Tout l'historique dans l'ordre : segments archives, puis fichier courant (comme requete())."""
+        return chain(self._entrees_archivees(None, None), self._entrees_courantes())
 
+    def afficher_historique(self):
         tableau = []
-        for entree in self.entrees_historique:
-            type_acces = self._determiner_type_acces(entree['statut'])
+        for entree in self._toutes_les_entrees():
+            type_acces = entree['type_acces']
             resultat = type_acces.upper() if type_acces != 'indetermine' else entree['statut']
             tableau.append([
                 entree['date_heure'],
@@ -145,24 +176,24 @@ class HistoriqueDesAcces:
                 resultat
             ])
 
+        if not tableau:
+            print("Erreur: Aucune entree dans l'historique.")
+            sys.exit(1)
+
+        # En-tete
+        print("\n" + "=" * 100)
+        print("HISTORIQUE DES ACCES")
+        print("=" * 100)
+
         headers = ['Date/Heure', 'UID', 'Nom', 'Type', 'Resultat']
         print(tabulate(tableau, headers=headers, tablefmt='grid'))
         print("=" * 100)
-        print(f"\nTotal: {len(self.entrees_historique)} entree(s)")
+        print(f"\nTotal: {len(tableau)} entree(s)")
 
     def filtrer_historique(self, filtre_choisi: str) -> dict:
-       
+        """Filtre et statistiques en un seul passage, sans copier les entrees."""
         filtre = filtre_choisi.lower()
         entrees_filtrees = []
-        
-        for entree in self.entrees_historique:
-            type_acces = self._determiner_type_acces(entree['statut'])
-            
-            if filtre == 'tous' or filtre == type_acces:
-                entree_complete = entree.copy()
-                entree_complete['type_acces'] = type_acces
-                entrees_filtrees.append(entree_complete)
-        
         statistiques = {
             'autorise': 0,
             'refuse': 0,
@@ -170,19 +201,44 @@ class HistoriqueDesAcces:
             'desactive': 0,
             'indetermine': 0
         }
+        tous = filtre == 'tous'
+        nombre_total = 0
         
-        for entree in self.entrees_historique:
-            type_acces = self._determiner_type_acces(entree['statut'])
-            statistiques[type_acces] = statistiques.get(type_acces, 0) + 1
+        # Segments archives compris : la rotation quotidienne ne cache pas les jours precedents
+        for entree in self._toutes_les_entrees():
+            nombre_total += 1
+            type_acces = entree['type_acces']
+            statistiques[type_acces] += 1
+            if tous or filtre == type_acces:
+                entrees_filtrees.append(entree)
         
         return {
             'entrees': entrees_filtrees,
-            'nombre_total': len(self.entrees_historique),
+            'nombre_total': nombre_total,
             'nombre_filtre': len(entrees_filtrees),
             'filtre_applique': filtre,
             'statistiques': statistiques
         }
     
+    def afficher_requete(self, sortie=None, **criteres) -> int:
+        """Ecrit les resultats d'une requete ligne par ligne, sans les accumuler."""
+        sortie = sortie or sys.stdout
+        colonnes = "{:<19}  {:<20}  {:<10}  {:<20}  {:<12}  {}"
+        sortie.write(colonnes.format('Date/Heure', 'UID', 'Type', 'Nom', 'Resultat', 'Statut') + "\n")
+        nombre = 0
+        for entree in self.requete(**criteres):
+            sortie.write(colonnes.format(
+                entree['date_heure'],
+                entree['uid'],
+                entree['type_carte'],
+                entree['nom'],
+                entree['type_acces'].upper(),
+                entree['statut'],
+            ) + "\n")
+            nombre += 1
+        sortie.write(f"\nTotal: {nombre} entree(s)\n")
+        return nombre
+
     def afficher_filtre(self, filtre: str):
         """Affiche l'historique filtre de maniere simplifiee"""
         resultat = self.filtrer_historique(filtre)
@@ -206,6 +262,160 @@ class HistoriqueDesAcces:
         else:
             print(f"Aucune entree pour le filtre '{filtre}'")
 
+    def requete(self, uid: Optional[str] = None, debut: Optional[str] = None, fin: Optional[str] = None,
+                nom: Optional[str] = None, type_acces: Optional[str] = None,
+                limite: Optional[int] = None) -> Iterator[Dict]:
+        """Entrees correspondant a tous les criteres donnes, produites au fil de l'eau.
+
+        Un UID passe par l'index UID -> positions ; une periode seule par l'index temporel.
+        Les segments archives (.gz) ne sont ouverts que s'ils chevauchent la periode.
+        """
+        if uid:
+            entrees_courantes = self._entrees_courantes()
+            archives = (
+                entrees[rang]
+                for entrees, postings in self._segments_archives(debut, fin)
+                for rang in postings.get(uid, ())
+            )
+            source = chain(archives, (entrees_courantes[rang] for rang in self._postings_uid.get(uid, ())))
+        elif debut:
+            source = self.entrees_entre(debut, fin)
+        else:
+            source = chain(self._entrees_archivees(None, fin), self._entrees_courantes())
+
+        nom = nom.lower() if nom else None
+        type_acces = type_acces.lower() if type_acces else None
+
+        def correspond(entree):
+            if debut and entree['date_heure'] < debut:
+                return False
+            if fin and entree['date_heure'] > fin:
+                return False
+            if nom and nom not in entree['nom'].lower():
+                return False
+            if type_acces and entree['type_acces'] != type_acces:
+                return False
+            return True
+
+        resultats = filter(correspond, source)
+        return islice(resultats, limite) if limite else resultats
+
+    def statistiques_globales(self) -> AgregatsAcces:
+        """Compteurs tenus par le journal ; seules les lignes pas encore agregees sont relues."""
+        return AgregatsAcces(self.fichier_historique).synchroniser(enregistrer=False)
+
+    def _segments_archives(self, debut: Optional[str], fin: Optional[str]):
+        """(entrees, index UID) de chaque segment qui chevauche la periode ; un segment n'est
+        decompresse et analyse qu'une fois, puis servi depuis le cache."""
+        manifeste = ManifesteSegments(self.fichier_historique).charger()
+        presents = {(segment['fichier'], segment['octets']) for segment in manifeste.segments}
+        # Segments supprimes par la retention : retires du cache
+        for cle in [cle for cle in self._cache_segments if cle not in presents]:
+            del self._cache_segments[cle]
+        for segment in manifeste.segments_entre(debut, fin):
+            cle = (segment['fichier'], segment['octets'])
+            analyse = self._cache_segments.get(cle)
+            if analyse is None:
+                entrees = []
+                postings = defaultdict(list)
+                for evenement in lire_evenements(manifeste.chemin_segment(segment)):
+                    entree = self._parser_ligne(evenement.vers_dict())
+                    if entree:
+                        postings[entree['uid']].append(len(entrees))
+                        entrees.append(entree)
+                analyse = self._cache_segments[cle] = (entrees, postings)
+            yield analyse
+
+    def _entrees_archivees(self, debut: Optional[str], fin: Optional[str]) -> Iterator[Dict]:
+        """Entrees des segments compresses qui chevauchent la periode (bornes optionnelles)."""
+        for entrees, _ in self._segments_archives(debut, fin):
+            for entree in entrees:
+                if (debut and entree['date_heure'] < debut) or (fin and entree['date_heure'] > fin):
+                    continue
+                yield entree
+
+    def entrees_entre(self, debut: str, fin: str):
+        """Entrees datees entre debut et fin (incluses) : segments archives concernes, puis
+        fichier courant lu via l'index temporel, sans charger tout l'historique."""
+        yield from self._entrees_archivees(debut, fin)
+        for evenement in lire_periode(self.fichier_historique, debut, fin):
+            entree = self._parser_ligne(evenement.vers_dict())
+            if entree:
+                yield entree
+
+    def afficher_periode(self, debut: str, fin: str):
+        donnees = [
+            [
+                entree['date_heure'],
+                entree['type_carte'],
+                entree['uid'],
+                entree['nom'],
+                entree['type_acces'].upper(),
+            ]
+            for entree in self.entrees_entre(debut, fin)
+        ]
+        print(f"\n=== PERIODE: {debut} -> {fin} ===")
+        print(f"Resultats: {len(donnees)} entree(s)\n")
+        if donnees:
+            headers = ['Date/Heure', 'Type', 'UID', 'Nom', 'Statut']
+            print(tabulate(donnees, headers=headers, tablefmt='grid'))
+
+
+def afficher_statistiques(agregats: AgregatsAcces, nb_jours: int = 7, nb_uid: int = 5):
+    """Statistiques globales lues dans les compteurs pre-agreges."""
+    total = agregats.total
+    print("\n=== STATISTIQUES GLOBALES ===")
+    print(f"Total: {total} entrees\n")
+
+    if total == 0:
+        print("Aucune entree disponible: impossible de calculer des pourcentages.")
+        return
+
+    stats_table = []
+    for type_acces in TYPES_ACCES:
+        count = agregats.par_type.get(type_acces, 0)
+        pourcentage = (count / total * 100) if total > 0 else 0
+        stats_table.append([
+            type_acces.capitalize(),
+            count,
+            f"{pourcentage:.1f}%"
+        ])
+    print(tabulate(stats_table, headers=['Type', 'Nombre', 'Pourcentage'], tablefmt='grid'))
+
+    jours = sorted(agregats.par_jour)[-nb_jours:]
+    print(f"\n--- {len(jours)} dernier(s) jour(s) ---")
+    print(tabulate(
+        [[jour, sum(agregats.par_jour[jour].values())]
+         + [agregats.par_jour[jour].get(type_acces, 0) for type_acces in TYPES_ACCES]
+         for jour in jours],
+        headers=['Jour', 'Total'] + [type_acces.capitalize() for type_acces in TYPES_ACCES],
+        tablefmt='grid',
+    ))
+
+    print("\n--- Acces par heure ---")
+    print(tabulate(
+        [[f"{heure}h", nombre] for heure, nombre in sorted(agregats.par_heure.items())],
+        headers=['Heure', 'Nombre'],
+        tablefmt='grid',
+    ))
+
+    print(f"\n--- {nb_uid} cartes les plus utilisees ---")
+    print(tabulate(agregats.par_uid.most_common(nb_uid), headers=['UID', 'Nombre'], tablefmt='grid'))
+
+
+def normaliser_borne(texte: str, fin: bool = False) -> str:
+    """'AAAA-MM-JJ' ou 'AAAA-MM-JJ HH:MM[:SS]' -> 'AAAA-MM-JJ HH:MM:SS' (borne incluse)."""
+    texte = texte.strip()
+    formats = [("%Y-%m-%d %H:%M:%S", ""), ("%Y-%m-%d %H:%M", ":59" if fin else ":00"),
+               ("%Y-%m-%d", " 23:59:59" if fin else " 00:00:00")]
+    for format_date, complement in formats:
+        try:
+            datetime.strptime(texte, format_date)
+        except ValueError:
+            continue
+        return texte + complement
+    raise ValueError(f"Date invalide (AAAA-MM-JJ [HH:MM]) : {texte!r}")
+
 
 def afficher_menu():
     """Affiche le menu de selection des filtres"""
@@ -218,13 +428,39 @@ def afficher_menu():
     print("4. Afficher uniquement les ALERTES")
     print("5. Afficher uniquement les cartes DESACTIVEES")
     print("6. Afficher les statistiques globales")
+    print("7. Afficher les acces sur une periode")
     print("0. Quitter")
     print("=" * 60)
 
 
+def analyser_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Historique des acces RFID")
+    parser.add_argument("--uid", help="UID de la carte (ex. 211-183-212-9-185)")
+    parser.add_argument("--from", dest="debut", help="Debut de periode (AAAA-MM-JJ [HH:MM])")
+    parser.add_argument("--to", dest="fin", help="Fin de periode (AAAA-MM-JJ [HH:MM])")
+    parser.add_argument("--nom", help="Nom du porteur (recherche partielle, sans casse)")
+    parser.add_argument("--type", dest="type_acces", choices=TYPES_ACCES, help="Type d'acces")
+    parser.add_argument("--limit", dest="limite", type=int, help="Nombre maximum de resultats")
+    return parser.parse_args(arguments)
+
+
 def main():
+    arguments = analyser_arguments()
     historique = HistoriqueDesAcces()
-    
+
+    # Avec des criteres : requete unique, resultats ecrits au fil de l'eau, sans menu
+    criteres = {
+        'uid': arguments.uid,
+        'debut': normaliser_borne(arguments.debut) if arguments.debut else None,
+        'fin': normaliser_borne(arguments.fin, fin=True) if arguments.fin else None,
+        'nom': arguments.nom,
+        'type_acces': arguments.type_acces,
+        'limite': arguments.limite,
+    }
+    if any(valeur is not None for valeur in criteres.values()):
+        historique.afficher_requete(**criteres)
+        return
+
     while True:
         afficher_menu()
         
@@ -246,29 +482,11 @@ def main():
             elif choix == '5':
                 historique.afficher_filtre('desactive')
             elif choix == '6':
-                resultat = historique.filtrer_historique('tous')
-                print("\n=== STATISTIQUES GLOBALES ===")
-                print(f"Total: {resultat['nombre_total']} entrees\n")
-
-                ordre_stats = ['autorise', 'refuse', 'alerte', 'desactive', 'indetermine']
-                stats_table = []
-                total = resultat['nombre_total']
-
-                if total == 0:
-                    print("Aucune entree disponible: impossible de calculer des pourcentages.")
-                    input("\nAppuyez sur Entree pour continuer...")
-                    continue
-
-                for type_acces in ordre_stats:
-                    count = resultat['statistiques'].get(type_acces, 0)
-                    pourcentage = (count / total * 100) if total > 0 else 0
-                    stats_table.append([
-                        type_acces.capitalize(),
-                        count,
-                        f"{pourcentage:.1f}%"
-                    ])
-
-                print(tabulate(stats_table, headers=['Type', 'Nombre', 'Pourcentage'], tablefmt='grid'))
+                afficher_statistiques(historique.statistiques_globales())
+            elif choix == '7':
+                debut = normaliser_borne(input("Debut (AAAA-MM-JJ [HH:MM]): "))
+                fin = normaliser_borne(input("Fin   (AAAA-MM-JJ [HH:MM]): "), fin=True)
+                historique.afficher_periode(debut, fin)
             else:
                 print("\nChoix invalide. Veuillez selectionner une option du menu.")
             
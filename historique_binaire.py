@@ -0,0 +1,333 @@
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+from collections import Counter
+from datetime import datetime, timedelta
+
+from ecriture_atomique import ecrire_fichier_atomique
+from evenement_acces import COLONNES_EVENEMENT, TYPES_ACCES, EvenementAcces, classifier_statut, lire_evenements
+from uid_carte import UidCarte
+
+try:
+    import numpy as np
+except ImportError:  # NumPy optionnel : lecture en pur Python
+    np = None
+
+# Historique binaire : en-tête de 8 octets puis enregistrements de taille fixe.
+# Les chaînes (noms, statuts, lecteurs, types de carte) sont dans un dictionnaire annexe
+# <fichier>.dict.json ; l'enregistrement n'en garde que l'indice.
+MAGIQUE = b"RFIDH"
+VERSION_BINAIRE = 1
+EN_TETE = struct.Struct("<5sBH")
+ENREGISTREMENT = struct.Struct("<IB10sHHBHBx")
+TAILLE_UID_MAX = 10
+
+# Horodatage : secondes depuis 1970-01-01 en heure locale « naïve », comme les dates du CSV
+_EPOQUE = datetime(1970, 1, 1)
+FORMAT_DATE = "%Y-%m-%d %H:%M:%S"
+
+if np is not None:
+    DTYPE_ENREGISTREMENT = np.dtype([
+        ("horodatage", "<u4"),
+        ("longueur_uid", "u1"),
+        ("uid", "S10"),
+        ("nom", "<u2"),
+        ("statut", "<u2"),
+        ("code", "u1"),
+        ("lecteur", "<u2"),
+        ("type_carte", "u1"),
+        ("_", "V1"),
+    ])
+    assert DTYPE_ENREGISTREMENT.itemsize == ENREGISTREMENT.size
+
+
+def fichier_dictionnaire(chemin):
+    return chemin + ".dict.json"
+
+
+def date_vers_horodatage(date_heure):
+    # Format fixe "AAAA-MM-JJ HH:MM:SS" : découpage direct, plusieurs fois plus rapide que strptime
+    if len(date_heure) != 19 or date_heure[4] != "-" or date_heure[10] != " ":
+        raise ValueError(f"Date invalide : {date_heure!r}")
+    date = datetime(int(date_heure[0:4]), int(date_heure[5:7]), int(date_heure[8:10]),
+                    int(date_heure[11:13]), int(date_heure[14:16]), int(date_heure[17:19]))
+    return int((date - _EPOQUE).total_seconds())
+
+
+def horodatage_vers_date(horodatage):
+    return (_EPOQUE + timedelta(seconds=int(horodatage))).strftime(FORMAT_DATE)
+
+
+def _uid_vers_octets(uid):
+    try:
+        octets = UidCarte.depuis_texte(uid).octets
+    except (ValueError, AttributeError):
+        return b""
+    return octets if len(octets) <= TAILLE_UID_MAX else b""
+
+
+class DictionnaireChaines:
+    """Chaînes -> indices, par catégorie ; persisté en JSON à côté du fichier binaire."""
+
+    CATEGORIES = ("noms", "statuts", "lecteurs", "types_carte")
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.valeurs = {categorie: [] for categorie in self.CATEGORIES}
+        self._indices = {categorie: {} for categorie in self.CATEGORIES}
+        self.modifie = False
+
+    def charger(self):
+        try:
+            with open(self.chemin, "r", encoding="utf-8") as fichier:
+                donnees = json.load(fichier)
+        except (OSError, ValueError):
+            return self
+        for categorie in self.CATEGORIES:
+            self.valeurs[categorie] = list(donnees.get(categorie, []))
+            self._indices[categorie] = {valeur: rang for rang, valeur in enumerate(self.valeurs[categorie])}
+        return self
+
+    def indice(self, categorie, valeur):
+        valeur = valeur or ""
+        rang = self._indices[categorie].get(valeur)
+        if rang is None:
+            rang = len(self.valeurs[categorie])
+            self.valeurs[categorie].append(valeur)
+            self._indices[categorie][valeur] = rang
+            self.modifie = True
+        return rang
+
+    def valeur(self, categorie, rang):
+        valeurs = self.valeurs[categorie]
+        return valeurs[rang] if rang < len(valeurs) else ""
+
+    def enregistrer(self):
+        if not self.modifie:
+            return
+        ecrire_fichier_atomique(self.chemin, lambda fichier: json.dump(self.valeurs, fichier, ensure_ascii=False))
+        self.modifie = False
+
+
+class EcrivainHistoriqueBinaire:
+    """Ajoute des EvenementAcces au format binaire (24 octets par passage)."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.dictionnaire = DictionnaireChaines(fichier_dictionnaire(chemin)).charger()
+        if not os.path.exists(chemin) or os.path.getsize(chemin) == 0:
+            with open(chemin, "wb") as fichier:
+                fichier.write(EN_TETE.pack(MAGIQUE, VERSION_BINAIRE, ENREGISTREMENT.size))
+
+    def _empaqueter(self, evenement):
+        uid = _uid_vers_octets(evenement.uid)
+        return ENREGISTREMENT.pack(
+            date_vers_horodatage(evenement.date_heure),
+            len(uid),
+            uid,
+            self.dictionnaire.indice("noms", evenement.nom),
+            self.dictionnaire.indice("statuts", evenement.statut),
+            TYPES_ACCES.index(classifier_statut(evenement.statut or "")),
+            self.dictionnaire.indice("lecteurs", evenement.lecteur),
+            self.dictionnaire.indice("types_carte", evenement.type_carte),
+        )
+
+    def ajouter(self, evenements):
+        donnees = b"".join(self._empaqueter(evenement) for evenement in evenements)
+        # Le dictionnaire est écrit avant les enregistrements qui y font référence
+        self.dictionnaire.enregistrer()
+        with open(self.chemin, "ab") as fichier:
+            fichier.write(donnees)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+
+
+class LecteurHistoriqueBinaire:
+    """Lecture de l'historique binaire par mmap.
+
+    Avec NumPy, les enregistrements sont vus comme un tableau structuré sans copie :
+    filtres et comptages sont vectorisés. Sans NumPy, mêmes résultats en pur Python.
+    """
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.dictionnaire = DictionnaireChaines(fichier_dictionnaire(chemin)).charger()
+        self._fichier = open(chemin, "rb")
+        taille = os.fstat(self._fichier.fileno()).st_size
+        if taille < EN_TETE.size:
+            raise ValueError(f"{chemin} n'est pas un historique binaire")
+        self._mmap = mmap.mmap(self._fichier.fileno(), 0, access=mmap.ACCESS_READ)
+        magique, version, taille_enregistrement = EN_TETE.unpack_from(self._mmap, 0)
+        if magique != MAGIQUE or version != VERSION_BINAIRE or taille_enregistrement != ENREGISTREMENT.size:
+            self.fermer()
+            raise ValueError(f"{chemin} n'est pas un historique binaire v{VERSION_BINAIRE}")
+        # Un enregistrement partiel en fin de fichier (écriture interrompue) est ignoré
+        self.nombre = (taille - EN_TETE.size) // ENREGISTREMENT.size
+        self.enregistrements = None
+        if np is not None:
+            self.enregistrements = np.frombuffer(
+                self._mmap, dtype=DTYPE_ENREGISTREMENT, count=self.nombre, offset=EN_TETE.size
+            )
+
+    def __len__(self):
+        return self.nombre
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+    def fermer(self):
+        # Les vues NumPy doivent disparaître avant la fermeture du mmap
+        self.enregistrements = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._fichier.close()
+
+    def _tuples(self):
+        return ENREGISTREMENT.iter_unpack(
+            memoryview(self._mmap)[EN_TETE.size:EN_TETE.size + self.nombre * ENREGISTREMENT.size]
+        )
+
+    def masque(self, debut=None, fin=None, uid=None, type_acces=None):
+        """Sélection des enregistrements (dates "AAAA-MM-JJ HH:MM:SS" incluses).
+
+        Tableau booléen NumPy, ou liste de booléens sans NumPy.
+        """
+        debut = date_vers_horodatage(debut) if debut else None
+        fin = date_vers_horodatage(fin) if fin else None
+        octets_uid = _uid_vers_octets(uid) if uid else None
+        code = TYPES_ACCES.index(type_acces) if type_acces else None
+
+        if self.enregistrements is not None:
+            donnees = self.enregistrements
+            selection = np.ones(self.nombre, dtype=bool)
+            if debut is not None:
+                selection &= donnees["horodatage"] >= debut
+            if fin is not None:
+                selection &= donnees["horodatage"] <= fin
+            if octets_uid is not None:
+                selection &= (donnees["longueur_uid"] == len(octets_uid)) & (donnees["uid"] == octets_uid)
+            if code is not None:
+                selection &= donnees["code"] == code
+            return selection
+
+        def garder(enregistrement):
+            horodatage, longueur, octets, _, _, code_enregistrement, _, _ = enregistrement
+            return ((debut is None or horodatage >= debut)
+                    and (fin is None or horodatage <= fin)
+                    and (octets_uid is None or (longueur == len(octets_uid) and octets[:longueur] == octets_uid))
+                    and (code is None or code_enregistrement == code))
+
+        return [garder(enregistrement) for enregistrement in self._tuples()]
+
+    def _selection(self, masque):
+        if masque is None:
+            return list(self._tuples())
+        if self.enregistrements is not None:
+            return self.enregistrements[masque].tolist()
+        return [enregistrement for enregistrement, garde in zip(self._tuples(), masque) if garde]
+
+    def compter_par_type(self, masque=None):
+        if self.enregistrements is not None:
+            codes = self.enregistrements["code"] if masque is None else self.enregistrements["code"][masque]
+            comptes = np.bincount(codes, minlength=len(TYPES_ACCES))
+            return {type_acces: int(comptes[rang]) for rang, type_acces in enumerate(TYPES_ACCES)}
+        comptes = Counter(enregistrement[5] for enregistrement in self._selection(masque))
+        return {type_acces: comptes.get(rang, 0) for rang, type_acces in enumerate(TYPES_ACCES)}
+
+    def compter_par_jour(self, masque=None):
+        if self.enregistrements is not None:
+            horodatages = self.enregistrements["horodatage"]
+            if masque is not None:
+                horodatages = horodatages[masque]
+            jours, comptes = np.unique(horodatages // 86400, return_counts=True)
+            paires = zip(jours.tolist(), comptes.tolist())
+        else:
+            paires = sorted(Counter(enregistrement[0] // 86400 for enregistrement in self._selection(masque)).items())
+        return {(_EPOQUE + timedelta(days=jour)).strftime("%Y-%m-%d"): nombre for jour, nombre in paires}
+
+    def evenements(self, masque=None):
+        """EvenementAcces des enregistrements sélectionnés (chaînes résolues par le dictionnaire)."""
+        valeur = self.dictionnaire.valeur
+        for horodatage, longueur, octets, nom, statut, _, lecteur, type_carte, *_ in self._selection(masque):
+            yield EvenementAcces(
+                date_heure=horodatage_vers_date(horodatage),
+                # NumPy retire les octets nuls de fin des champs S10 : on les rétablit
+                uid=UidCarte(octets.ljust(longueur, b"\0")[:longueur]).texte if longueur else "",
+                nom=valeur("noms", nom),
+                statut=valeur("statuts", statut),
+                lecteur=valeur("lecteurs", lecteur),
+                type_carte=valeur("types_carte", type_carte),
+            )
+
+
+def convertir_csv_vers_binaire(chemin_csv, chemin_binaire, taille_lot=10000):
+    ecrivain = EcrivainHistoriqueBinaire(chemin_binaire)
+    lot = []
+    nombre = 0
+    for evenement in lire_evenements(chemin_csv):
+        lot.append(evenement)
+        if len(lot) >= taille_lot:
+            ecrivain.ajouter(lot)
+            nombre += len(lot)
+            lot = []
+    if lot:
+        ecrivain.ajouter(lot)
+        nombre += len(lot)
+    return nombre
+
+
+def exporter_csv(chemin_binaire, chemin_csv, **criteres):
+    """Exporte (tout ou une sélection) au schéma CSV courant."""
+    with LecteurHistoriqueBinaire(chemin_binaire) as lecteur:
+        masque = lecteur.masque(**criteres) if criteres else None
+        with open(chemin_csv, "w", newline="", encoding="utf-8") as fichier:
+            writer = csv.writer(fichier)
+            writer.writerow(COLONNES_EVENEMENT)
+            nombre = 0
+            for evenement in lecteur.evenements(masque):
+                writer.writerow(evenement.vers_ligne())
+                nombre += 1
+    return nombre
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Historique des accès au format binaire")
+    commandes = parser.add_subparsers(dest="commande", required=True)
+
+    convertir = commandes.add_parser("convertir", help="CSV -> binaire")
+    convertir.add_argument("csv")
+    convertir.add_argument("binaire")
+
+    exporter = commandes.add_parser("exporter", help="Binaire -> CSV")
+    exporter.add_argument("binaire")
+    exporter.add_argument("csv")
+    exporter.add_argument("--uid")
+    exporter.add_argument("--from", dest="debut", help="AAAA-MM-JJ HH:MM:SS")
+    exporter.add_argument("--to", dest="fin", help="AAAA-MM-JJ HH:MM:SS")
+    exporter.add_argument("--type", dest="type_acces", choices=TYPES_ACCES)
+
+    statistiques = commandes.add_parser("stats", help="Comptages par type et par jour")
+    statistiques.add_argument("binaire")
+
+    arguments = parser.parse_args()
+    if arguments.commande == "convertir":
+        print(f"{convertir_csv_vers_binaire(arguments.csv, arguments.binaire)} événement(s) convertis.")
+    elif arguments.commande == "exporter":
+        criteres = {cle: valeur for cle, valeur in
+                    (("uid", arguments.uid), ("debut", arguments.debut),
+                     ("fin", arguments.fin), ("type_acces", arguments.type_acces)) if valeur}
+        print(f"{exporter_csv(arguments.binaire, arguments.csv, **criteres)} événement(s) exportés.")
+    else:
+        with LecteurHistoriqueBinaire(arguments.binaire) as lecteur:
+            print(f"Total : {len(lecteur)}")
+            for type_acces, nombre in lecteur.compter_par_type().items():
+                print(f"  {type_acces:<12} {nombre}")
+            for jour, nombre in lecteur.compter_par_jour().items():
+                print(f"  {jour}  {nombre}")
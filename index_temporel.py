@@ -0,0 +1,144 @@
+import bisect
+import csv
+import io
+
+from evenement_acces import COLONNES_EVENEMENT, NB_COLONNES, EvenementAcces
+
+
+def fichier_index(chemin_historique):
+    return chemin_historique + ".idx"
+
+
+def _date_de_ligne(ligne_brute):
+    # Date/Heure est la 2e colonne du schéma courant ; jamais entre guillemets
+    champs = ligne_brute.split(b",", 2)
+    if len(champs) < 3:
+        return None
+    return champs[1].decode("utf-8", "replace")
+
+
+class IndexTemporel:
+    """Index clairsemé date -> position (octets) d'une ligne sur `pas` de l'historique.
+
+    Fichier annexe <historique>.idx, une entrée "date,position" par ligne, tenu à jour par
+    JournalRFID à chaque lot écrit. L'historique étant écrit dans l'ordre chronologique,
+    une requête par période se positionne directement près de la date de début.
+    """
+
+    def __init__(self, chemin_historique, pas=256):
+        self.chemin_historique = chemin_historique
+        self.chemin_index = fichier_index(chemin_historique)
+        self.pas = pas
+        self.dates = []
+        self.positions = []
+        # Lignes écrites depuis la dernière entrée de l'index (côté écrivain)
+        self._lignes_depuis_entree = 0
+        self._en_attente = []
+
+    # ---- Lecture ----
+    def charger(self):
+        self.dates = []
+        self.positions = []
+        try:
+            with open(self.chemin_index, "r", encoding="utf-8") as fichier:
+                for ligne in fichier:
+                    date, _, position = ligne.rstrip("\n").rpartition(",")
+                    if date and position.isdigit():
+                        self.dates.append(date)
+                        self.positions.append(int(position))
+        except OSError:
+            pass
+        return self
+
+    def position_debut(self, debut):
+        """Position d'où lire pour trouver toutes les lignes datées >= debut (0 si inconnue)."""
+        # Strictement avant `debut` : les lignes de même seconde qui précèdent l'entrée sont incluses
+        rang = bisect.bisect_left(self.dates, debut)
+        return self.positions[rang - 1] if rang > 0 else 0
+
+    def est_valide(self):
+        # La dernière entrée doit pointer sur une ligne de l'historique portant la même date
+        if not self.positions:
+            return True
+        try:
+            with open(self.chemin_historique, "rb") as fichier:
+                fichier.seek(self.positions[-1])
+                return _date_de_ligne(fichier.readline()) == self.dates[-1]
+        except OSError:
+            return False
+
+    # ---- Écriture (JournalRFID) ----
+    def synchroniser(self):
+        """Au démarrage de l'écrivain : valide l'index, le reconstruit s'il ne correspond plus."""
+        self.charger()
+        if not self.positions or not self.est_valide():
+            self.reconstruire()
+            return
+        # Lignes écrites après la dernière ligne indexée
+        self._lignes_depuis_entree = 0
+        with open(self.chemin_historique, "rb") as fichier:
+            fichier.seek(self.positions[-1])
+            fichier.readline()
+            for ligne in fichier:
+                if ligne.strip():
+                    self._lignes_depuis_entree += 1
+
+    def reconstruire(self):
+        self.dates = []
+        self.positions = []
+        self._lignes_depuis_entree = 0
+        self._en_attente = []
+        with open(self.chemin_historique, "rb") as fichier:
+            en_tete = fichier.readline()
+            position = len(en_tete)
+            for ligne in fichier:
+                if ligne.strip():
+                    self.noter(_date_de_ligne(ligne), position)
+                position += len(ligne)
+        with open(self.chemin_index, "w", encoding="utf-8") as fichier:
+            fichier.writelines(f"{date},{position}\n" for date, position in self._en_attente)
+        self._en_attente = []
+
+    def noter(self, date, position):
+        # Appelé pour chaque ligne écrite : la 1re ligne puis une sur `pas` entrent dans l'index
+        if self.positions and self._lignes_depuis_entree + 1 < self.pas:
+            self._lignes_depuis_entree += 1
+            return
+        if not date:
+            return
+        self._lignes_depuis_entree = 0
+        self.dates.append(date)
+        self.positions.append(position)
+        self._en_attente.append((date, position))
+
+    def enregistrer(self):
+        """Ajoute au fichier index les entrées notées ; à appeler après le fsync des lignes."""
+        if not self._en_attente:
+            return
+        with open(self.chemin_index, "a", encoding="utf-8") as fichier:
+            fichier.writelines(f"{date},{position}\n" for date, position in self._en_attente)
+        self._en_attente = []
+
+
+def lire_periode(chemin_historique, debut, fin=None, index=None):
+    """Itère les événements datés entre debut et fin (chaînes "AAAA-MM-JJ HH:MM:SS", incluses).
+
+    Lecture à partir de la position donnée par l'index, arrêt à la première ligne après `fin` :
+    le coût suit la taille du résultat et non celle du fichier.
+    """
+    if index is None:
+        index = IndexTemporel(chemin_historique).charger()
+    with open(chemin_historique, "rb") as brut:
+        en_tete = brut.readline()
+        if next(csv.reader([en_tete.decode("utf-8")]), []) != COLONNES_EVENEMENT:
+            raise ValueError(f"{chemin_historique} n'est pas au schéma courant (voir evenement_acces.py)")
+        brut.seek(max(index.position_debut(debut), len(en_tete)))
+        for champs in csv.reader(io.TextIOWrapper(brut, encoding="utf-8", newline="")):
+            if len(champs) < NB_COLONNES:
+                continue
+            date = champs[1]
+            if date < debut:
+                continue
+            if fin is not None and date > fin:
+                return
+            yield EvenementAcces.depuis_ligne(champs)
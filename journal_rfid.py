@@ -1,22 +1,213 @@
 import csv
+import io
 import os
-from typing import Iterable
+import queue
+import socket
+import threading
+import time
+from typing import Iterable, Optional, Union
+
+from agregats_acces import AgregatsAcces
+from evenement_acces import COLONNES_EVENEMENT, EvenementAcces, convertir_historique, est_au_schema_courant
+from index_temporel import IndexTemporel
+from rotation_historique import ROTATION_QUOTIDIENNE, RotationHistorique
+from uid_carte import UidCarte, normaliser_uid
+
+# Politiques quand la file du journal est pleine
+DEBORDEMENT_PLUS_ANCIEN = "plus_ancien"   # on retire la ligne la plus ancienne en attente
+DEBORDEMENT_NOUVEAU = "nouveau"           # on rejette la nouvelle ligne
+DEBORDEMENT_BLOQUER = "bloquer"           # on attend (au plus delai_blocage secondes)
+
+_FIN = object()
 
 
 class JournalRFID:
-    def __init__(self, nom_fichier: str):
+    """Seul écrivain de l'historique des accès, au schéma d'événement versionné (evenement_acces).
+
+    enregistrer() ne fait que déposer la ligne dans une file bornée : la boucle de scan
+    n'attend jamais la carte SD. Les lignes sont écrites par lots, quand le lot est plein,
+    après intervalle_vidage secondes, ou à la fermeture.
+    """
+
+    def __init__(self, nom_fichier: str, id_lecteur: Optional[str] = None, type_carte: str = "MIFARE",
+                 taille_lot: int = 64, intervalle_vidage: float = 1.0,
+                 taille_file: int = 1024, politique_debordement: str = DEBORDEMENT_PLUS_ANCIEN,
+                 delai_blocage: float = 0.5, pas_index: int = 256,
+                 rotation: Optional[str] = ROTATION_QUOTIDIENNE, taille_max_segment: int = 5 * 1024 * 1024,
+                 retention_jours: Optional[int] = 365, retention_segments: Optional[int] = None):
+        if politique_debordement not in (DEBORDEMENT_PLUS_ANCIEN, DEBORDEMENT_NOUVEAU, DEBORDEMENT_BLOQUER):
+            raise ValueError(f"Politique de débordement inconnue : {politique_debordement}")
         self.nom_fichier = nom_fichier
+        self.id_lecteur = id_lecteur or socket.gethostname()
+        self.type_carte = type_carte
+        self.taille_lot = taille_lot
+        self.intervalle_vidage = intervalle_vidage
+        self.politique_debordement = politique_debordement
+        self.delai_blocage = delai_blocage
+        self.nb_lignes_perdues = 0
+        self.nb_lots_ecrits = 0
+        self._file = queue.Queue(maxsize=taille_file)
         self._assurer_fichier()
+        # Index date -> position tenu à jour à chaque lot (requêtes par période)
+        self.index = IndexTemporel(nom_fichier, pas=pas_index)
+        self.index.synchroniser()
+        # Compteurs par jour / heure / UID / type, mis à jour à chaque lot
+        self.agregats = AgregatsAcces(nom_fichier).synchroniser()
+        # Segments fermés compressés en .gz, listés dans <historique>.segments.json
+        self.rotation = None
+        if rotation:
+            self.rotation = RotationHistorique(
+                nom_fichier,
+                mode=rotation,
+                taille_max=taille_max_segment,
+                retention_jours=retention_jours,
+                retention_segments=retention_segments,
+            )
+        self._thread = threading.Thread(target=self._boucle, daemon=True)
+        self._thread.start()
 
     def _assurer_fichier(self):
-        if os.path.exists(self.nom_fichier):
+        if os.path.exists(self.nom_fichier) and os.path.getsize(self.nom_fichier) > 0:
+            # Historique d'un ancien format : converti une fois, avant la première écriture
+            if not est_au_schema_courant(self.nom_fichier):
+                convertir_historique(self.nom_fichier)
             return
         with open(self.nom_fichier, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
-            writer.writerow(["Date/Heure", "UID", "Nom", "Statut"])
+            writer.writerow(COLONNES_EVENEMENT)
+
+    def enregistrer(self, date: str, uid: Union[UidCarte, Iterable[int]], nom: str, statut: str,
+                    raison: str = "", credits_avant: Optional[int] = None,
+                    credits_apres: Optional[int] = None, latence_ms: Optional[float] = None) -> EvenementAcces:
+        evenement = EvenementAcces(
+            date_heure=date,
+            uid=normaliser_uid(uid).texte,
+            nom=nom,
+            statut=statut,
+            lecteur=self.id_lecteur,
+            type_carte=self.type_carte,
+            raison=raison,
+            credits_avant=credits_avant,
+            credits_apres=credits_apres,
+            latence_ms=latence_ms,
+        )
+        self.enregistrer_evenement(evenement)
+        return evenement
+
+    def enregistrer_evenement(self, evenement: EvenementAcces):
+        self._deposer(evenement.vers_ligne())
+
+    def _deposer(self, ligne):
+        if self._thread is None:
+            print("[JOURNAL] Journal fermé : ligne ignorée.")
+            self.nb_lignes_perdues += 1
+            return
+        try:
+            if self.politique_debordement == DEBORDEMENT_BLOQUER:
+                self._file.put(ligne, timeout=self.delai_blocage)
+            else:
+                self._file.put_nowait(ligne)
+            return
+        except queue.Full:
+            pass
 
-    def enregistrer(self, date: str, uid: Iterable[int], nom: str, statut: str):
-        uid_str = "-".join(str(octet) for octet in uid)
-        with open(self.nom_fichier, "a", newline="", encoding="utf-8") as fichier_csv:
-            writer = csv.writer(fichier_csv)
-            writer.writerow([date, uid_str, nom, statut])
+        if self.politique_debordement == DEBORDEMENT_PLUS_ANCIEN:
+            try:
+                self._file.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._file.put_nowait(ligne)
+            except queue.Full:
+                pass
+        self.nb_lignes_perdues += 1
+        print(f"[JOURNAL] File pleine : {self.nb_lignes_perdues} ligne(s) perdue(s) au total.")
+
+    def _boucle(self):
+        lot = []
+        limite = None
+        while True:
+            delai = None if limite is None else max(limite - time.monotonic(), 0)
+            try:
+                ligne = self._file.get(timeout=delai)
+            except queue.Empty:
+                ligne = None
+
+            if ligne is _FIN:
+                self._ecrire_lot(lot)
+                return
+            if ligne is not None:
+                if not lot:
+                    limite = time.monotonic() + self.intervalle_vidage
+                lot.append(ligne)
+            if lot and (len(lot) >= self.taille_lot or time.monotonic() >= limite):
+                self._ecrire_lot(lot)
+                lot = []
+                limite = None
+
+    def _ecrire_lot(self, lot):
+        if self.rotation is None:
+            self._ecrire_lignes(lot)
+            return
+        # Un lot peut chevaucher minuit : les lignes du nouveau jour vont dans le nouveau segment
+        debut = 0
+        for rang, ligne in enumerate(lot):
+            if self.rotation.doit_tourner(ligne[1]):
+                self._ecrire_lignes(lot[debut:rang])
+                debut = rang
+                self._tourner()
+            self.rotation.noter_ligne(ligne[1])
+        self._ecrire_lignes(lot[debut:])
+
+    def _tourner(self):
+        try:
+            self.rotation.tourner()
+        except Exception as e:
+            print(f"[ERREUR] Rotation de l'historique : {e}")
+            return
+        # Nouveau fichier courant : l'index repart de zéro, les compteurs restent cumulés
+        self.index = IndexTemporel(self.nom_fichier, pas=self.index.pas)
+        self.index.reconstruire()
+        self.agregats.changer_de_fichier()
+
+    def _ecrire_lignes(self, lot):
+        if not lot:
+            return
+        try:
+            with open(self.nom_fichier, "ab") as fichier_csv:
+                position = fichier_csv.tell()
+                tampon = io.StringIO(newline="")
+                writer = csv.writer(tampon)
+                for ligne in lot:
+                    writer.writerow(ligne)
+                    octets = tampon.getvalue().encode("utf-8")
+                    tampon.seek(0)
+                    tampon.truncate()
+                    self.index.noter(ligne[1], position)
+                    fichier_csv.write(octets)
+                    position += len(octets)
+                fichier_csv.flush()
+                os.fsync(fichier_csv.fileno())
+            self.index.enregistrer()
+            for ligne in lot:
+                self.agregats.ajouter(ligne[1], ligne[3], ligne[6])
+            self.agregats.enregistrer(position)
+            self.nb_lots_ecrits += 1
+        except Exception as e:
+            print(f"[ERREUR ECRITURE] Journal des accès : {e}")
+            self.nb_lignes_perdues += len(lot)
+
+    def fermer(self, delai: float = 5.0):
+        """Écrit les lignes encore en file puis arrête le thread d'écriture."""
+        if self._thread is None:
+            return
+        # Le marqueur de fin passe toujours, même file pleine
+        while True:
+            try:
+                self._file.put(_FIN, timeout=0.1)
+                break
+            except queue.Full:
+                if not self._thread.is_alive():
+                    break
+        self._thread.join(timeout=delai)
+        self._thread = None
@@ -1,9 +1,41 @@
 import json
+import random
 import ssl
+import threading
+import time
+from collections import Counter
+
 import paho.mqtt.client as mqtt
 
+from encodage_mqtt import ENCODAGE_JSON, creer_encodeur
+from evenement_acces import EvenementAcces, classifier_statut
+from spool_mqtt import SpoolMqtt
+
+ETAT_DECONNECTE = "deconnecte"
+ETAT_CONNEXION = "connexion"
+ETAT_CONNECTE = "connecte"
+
 
 class MqttPublisher:
+    """Publie les événements d'accès via un spool disque (store-and-forward).
+
+    publish() ajoute le message au spool et rend la main tout de suite. Un thread d'envoi
+    le transmet en QoS 1 avec au plus `fenetre_envoi` messages en vol, et ne le retire du
+    spool qu'au PUBACK. Après une coupure, le retard est rejoué à `debit_rattrapage` msg/s.
+
+    La connexion (TCP + TLS) se fait en arrière-plan : le constructeur rend la main tout de
+    suite, broker joignable ou non. Les reconnexions suivent un backoff exponentiel avec
+    gigue (`delai_reconnexion_min` à `delai_reconnexion_max` s) ; `on_etat_connexion(etat)`
+    est appelé à chaque changement d'état (ETAT_DECONNECTE, ETAT_CONNEXION, ETAT_CONNECTE).
+
+    Mode lots (taille_lot > 1) : les événements sont regroupés dans une seule charge
+    (chacun garde sa date_heure), envoyée dès que le lot compte `taille_lot` événements, que
+    le plus ancien attend depuis `delai_lot_ms` ou que la charge atteint `octets_max_lot` octets.
+
+    `encodage` choisit le format sur le réseau (voir encodage_mqtt) : "json", "binaire" ou
+    "binaire_zlib". Le spool garde toujours le JSON : changer d'encodage ne perd rien.
+    """
+
     def __init__(
         self,
         utiliser_mqtt: bool,
@@ -13,6 +45,16 @@ class MqttPublisher:
         mqtt_username: str = None,
         mqtt_certfile: str = None,
         mqtt_keyfile: str = None,
+        fichier_spool: str = "mqtt_spool.db",
+        fenetre_envoi: int = 20,
+        debit_rattrapage: float = 20.0,
+        delai_reconnexion_min: float = 1.0,
+        delai_reconnexion_max: float = 60.0,
+        on_etat_connexion=None,
+        taille_lot: int = 1,
+        delai_lot_ms: float = 250,
+        octets_max_lot: int = 32 * 1024,
+        encodage: str = ENCODAGE_JSON,
     ):
         self.utiliser_mqtt = utiliser_mqtt
         self.broker = broker
@@ -21,11 +63,37 @@ class MqttPublisher:
         self.mqtt_username = mqtt_username
         self.mqtt_certfile = mqtt_certfile
         self.mqtt_keyfile = mqtt_keyfile
+        self.fenetre_envoi = fenetre_envoi
+        self.debit_rattrapage = debit_rattrapage
+        self.delai_reconnexion_min = delai_reconnexion_min
+        self.delai_reconnexion_max = delai_reconnexion_max
+        self.on_etat_connexion = on_etat_connexion
+        self.taille_lot = max(1, taille_lot)
+        self.delai_lot = delai_lot_ms / 1000.0
+        self.octets_max_lot = octets_max_lot
+        self.encodeur = creer_encodeur(encodage)
+        self.etat = ETAT_DECONNECTE
         self.client = None
+        self.spool = None
 
         if not self.utiliser_mqtt:
             return
 
+        self.spool = SpoolMqtt(fichier_spool)
+        self._condition = threading.Condition()
+        self._connecte = False
+        self._arret = False
+        self._vidage = False
+        # mid MQTT -> Ids des messages du spool envoyés dans ce lot, en attente de PUBACK
+        self._en_vol = {}
+        # PUBACK reçus avant que publish() ait rendu son mid
+        self._acquittes_en_avance = set()
+        # Dernier Id du spool envoyé sur la connexion courante
+        self._dernier_envoye = 0
+        # Échecs consécutifs depuis la dernière connexion acceptée (exposant du backoff)
+        self._tentatives = 0
+        self._stats_lots = {"lots": 0, "evenements": 0, "octets": 0, "par_taille": Counter(), "declencheurs": Counter()}
+
         self.client = mqtt.Client(protocol=mqtt.MQTTv311)
 
         if self.port == 8883 and self.mqtt_certfile and self.mqtt_keyfile:
@@ -37,35 +105,237 @@ class MqttPublisher:
                 tls_version=ssl.PROTOCOL_TLSv1_2,
             )
             self.client.username_pw_set(username=self.mqtt_username, password=None)
-            self.client.on_connect = self._on_connect
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
 
-        try:
-            self.client.connect(self.broker, self.port, 60)
-            self.client.loop_start()
-        except Exception as e:
-            print(f"[ERREUR FATALE] Impossible de se connecter au broker MQTT: {e}")
-            self.utiliser_mqtt = False
+        # Aucune connexion ici : elle est établie par le thread réseau
+        self.client.connect_async(self.broker, self.port, 60)
+        self._thread_reseau = threading.Thread(target=self._boucle_reseau, daemon=True)
+        self._thread_reseau.start()
 
-    def publish(self, date, uid):
-        if not self.utiliser_mqtt or not self.client:
+        self._thread_envoi = threading.Thread(target=self._boucle_envoi, daemon=True)
+        self._thread_envoi.start()
+
+    def publish(self, evenement: EvenementAcces, sequence: int):
+        """Publie l'événement complet d'un scan ; (lecteur, sequence) l'identifie de façon unique."""
+        if not self.utiliser_mqtt or not self.spool:
             return
-        uid_str = "-".join(str(octet) for octet in uid)
-        info_carte = json.dumps({"date_heure": date, "uid": uid_str})
+        message = evenement.vers_dict()
+        message["sequence"] = sequence
+        message["type_acces"] = classifier_statut(evenement.statut)
+        info_carte = json.dumps(message, ensure_ascii=False)
 
         try:
-            self.client.publish(self.sujet_log, info_carte)
-            print(f"[MQTT] Message publie a {self.sujet_log} : {info_carte}")
+            self.spool.ajouter(self.sujet_log, info_carte)
+            with self._condition:
+                self._condition.notify_all()
+            print(f"[MQTT] Message mis en file pour {self.sujet_log} : {info_carte}")
         except Exception as e:
-            print(f"[AVERTISSEMENT] Erreur lors de la publication MQTT: {e}")
+            print(f"[AVERTISSEMENT] Erreur lors de la mise en file MQTT: {e}")
+
+    def en_attente(self):
+        """Nombre de messages pas encore acquittés par le broker."""
+        return self.spool.taille() if self.spool else 0
 
-    def close(self):
+    def statistiques_lots(self):
+        """Lots envoyés : nombre, événements, octets, répartition par taille et par déclencheur."""
+        if not self.utiliser_mqtt:
+            return {}
+        with self._condition:
+            stats = dict(self._stats_lots)
+            stats["par_taille"] = dict(stats["par_taille"])
+            stats["declencheurs"] = dict(stats["declencheurs"])
+        stats["moyenne"] = stats["evenements"] / stats["lots"] if stats["lots"] else 0.0
+        return stats
+
+    def _changer_etat(self, etat):
+        if etat == self.etat:
+            return
+        self.etat = etat
+        if self.on_etat_connexion:
+            try:
+                self.on_etat_connexion(etat)
+            except Exception as e:
+                print(f"[AVERTISSEMENT] Erreur dans le rappel d'état MQTT: {e}")
+
+    def _delai_reconnexion(self):
+        # Backoff exponentiel plafonné, tiré dans [plafond / 2, plafond] : après une panne du
+        # broker, les lecteurs ne se reconnectent pas tous au même instant
+        plafond = min(self.delai_reconnexion_max, self.delai_reconnexion_min * 2 ** min(self._tentatives, 16))
+        self._tentatives += 1
+        return random.uniform(plafond / 2, plafond)
+
+    def _boucle_reseau(self):
+        while not self._arret:
+            self._changer_etat(ETAT_CONNEXION)
+            try:
+                rc = self.client.reconnect()
+            except Exception as e:
+                print(f"[MQTT] Broker injoignable ({e}) : les messages sont conservés dans le spool.")
+                rc = None
+            # Socket ouvert : la boucle réseau tourne jusqu'à la coupure
+            while rc == mqtt.MQTT_ERR_SUCCESS and not self._arret:
+                rc = self.client.loop(timeout=1.0)
+            if self._arret:
+                return
+            self._changer_etat(ETAT_DECONNECTE)
+
+            delai = self._delai_reconnexion()
+            print(f"[MQTT] Nouvelle tentative de connexion dans {delai:.1f} s.")
+            with self._condition:
+                self._condition.wait_for(lambda: self._arret, timeout=delai)
+
+    def _preparer_lot(self, apres):
+        """(lot, déclencheur, attente) : lot prêt à partir, ou (None, None, secondes à attendre).
+
+        lot = (sujet, [(id, charge encodée)], brut) ; brut=True : un seul message que l'encodeur
+        n'a pas pu encoder, envoyé tel qu'il est dans le spool (JSON) plutôt que perdu.
+        """
+        messages = self.spool.suivants(apres, self.taille_lot)
+        if not messages:
+            return None, None, 1.0
+        sujet = messages[0][1]
+        lot = []
+        octets = 2
+        declencheur = None
+        for identifiant, sujet_message, charge, cree in messages:
+            # Un lot ne mélange pas les sujets et ne dépasse pas octets_max_lot (sauf événement seul)
+            if sujet_message != sujet:
+                declencheur = "sujet"
+                break
+            if self.encodeur.nom != ENCODAGE_JSON:
+                try:
+                    charge_encodee = self.encodeur.encoder(json.loads(charge))
+                except Exception as e:
+                    if lot:
+                        # Envoyé seul au prochain tour, après le lot déjà constitué
+                        declencheur = "brut"
+                        break
+                    # Jamais supprimé du spool : le consommateur reconnaît le JSON au premier octet
+                    print(f"[AVERTISSEMENT] Message MQTT {identifiant} non encodable en {self.encodeur.nom}, "
+                          f"envoyé tel quel : {e}")
+                    return (sujet, [(identifiant, charge)], True), "brut", 0.0
+                charge = charge_encodee
+            if lot and octets + len(charge) + 1 > self.octets_max_lot:
+                declencheur = "octets"
+                break
+            lot.append((identifiant, charge))
+            octets += len(charge) + 1
+        if declencheur is None and len(lot) >= self.taille_lot:
+            declencheur = "nombre"
+        if declencheur is None:
+            attente = messages[0][3] + self.delai_lot - time.time()
+            if attente > 0 and not self._vidage:
+                return None, None, attente
+            declencheur = "delai"
+        return (sujet, lot, False), declencheur, 0.0
+
+    def _boucle_envoi(self):
+        intervalle = 1.0 / self.debit_rattrapage if self.debit_rattrapage else 0.0
+        prochain_envoi = 0.0
+        while True:
+            with self._condition:
+                while not self._arret and (not self._connecte or len(self._en_vol) >= self.fenetre_envoi):
+                    self._condition.wait(1.0)
+                if self._arret:
+                    return
+                apres = self._dernier_envoye
+
+            lot, declencheur, attente = self._preparer_lot(apres)
+            if lot is None:
+                # publish() réveille la boucle : le lot est réévalué à chaque nouvel événement
+                with self._condition:
+                    self._condition.wait(attente)
+                continue
+            sujet, messages, brut = lot
+            if brut:
+                charge = messages[0][1]
+            else:
+                charge = self.encodeur.assembler([charge for _, charge in messages], lot=self.taille_lot > 1)
+
+            # Débit limité : un long retard ne sature ni le lien ni le broker
+            attente = prochain_envoi - time.monotonic()
+            if attente > 0:
+                time.sleep(attente)
+            prochain_envoi = max(prochain_envoi, time.monotonic()) + intervalle
+
+            with self._condition:
+                if self._arret or not self._connecte:
+                    continue
+            identifiants = [identifiant for identifiant, _ in messages]
+            # Jamais sous self._condition : paho appelle on_publish en tenant ses propres verrous
+            info = self.client.publish(sujet, charge, qos=1)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                continue
+            with self._condition:
+                self._dernier_envoye = identifiants[-1]
+                self._stats_lots["lots"] += 1
+                self._stats_lots["evenements"] += len(identifiants)
+                self._stats_lots["octets"] += len(charge)
+                self._stats_lots["par_taille"][len(identifiants)] += 1
+                self._stats_lots["declencheurs"][declencheur] += 1
+                if info.mid in self._acquittes_en_avance:
+                    self._acquittes_en_avance.discard(info.mid)
+                    acquitte = True
+                else:
+                    self._en_vol[info.mid] = identifiants
+                    acquitte = False
+            if acquitte:
+                self.spool.supprimer(identifiants)
+
+    def close(self, delai: float = 2.0):
         if not self.utiliser_mqtt or not self.client:
             return
-        self.client.loop_stop()
+        # Envoie le lot en cours sans attendre son délai et laisse un court délai aux messages
+        # en vol ; le reste sera renvoyé au prochain démarrage
+        limite = time.monotonic() + delai
+        with self._condition:
+            self._vidage = True
+            self._condition.notify_all()
+            while (self._en_vol or (self._connecte and self.spool.taille())) and time.monotonic() < limite:
+                self._condition.wait(0.1)
+            self._arret = True
+            self._condition.notify_all()
+        self._thread_envoi.join(timeout=2)
+        # Une tentative bloquée dans la poignée de main TLS n'empêche pas l'arrêt (thread démon)
+        self._thread_reseau.join(timeout=2)
         self.client.disconnect()
+        self._changer_etat(ETAT_DECONNECTE)
+        stats = self.statistiques_lots()
+        if stats["lots"]:
+            print(f"[MQTT] {stats['lots']} envoi(s), {stats['evenements']} événement(s), "
+                  f"{stats['moyenne']:.1f} par envoi en moyenne.")
+        self.spool.fermer()
 
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f"[MQTT] Connexion reussie a {self.broker}")
+            with self._condition:
+                # Les messages non acquittés restent dans le spool : on reprend depuis le plus ancien
+                self._connecte = True
+                self._tentatives = 0
+                self._en_vol.clear()
+                self._acquittes_en_avance.clear()
+                self._dernier_envoye = 0
+                self._condition.notify_all()
+            self._changer_etat(ETAT_CONNECTE)
         else:
             print(f"[MQTT] Echec de la connexion (RC={rc})")
+
+    def _on_disconnect(self, client, userdata, rc):
+        if rc != 0:
+            print(f"[MQTT] Connexion perdue (RC={rc}), reconnexion en arrière-plan.")
+        with self._condition:
+            self._connecte = False
+            self._en_vol.clear()
+            self._condition.notify_all()
+
+    def _on_publish(self, client, userdata, mid):
+        with self._condition:
+            identifiants = self._en_vol.pop(mid, None)
+            if identifiants is None:
+                self._acquittes_en_avance.add(mid)
+            self._condition.notify_all()
+        if identifiants is not None:
+            self.spool.supprimer(identifiants)
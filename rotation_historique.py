@@ -0,0 +1,178 @@
+import csv
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from ecriture_atomique import ecrire_fichier_atomique
+from evenement_acces import COLONNES_EVENEMENT
+
+ROTATION_QUOTIDIENNE = "quotidienne"
+ROTATION_TAILLE = "taille"
+
+
+def fichier_manifeste(chemin_historique):
+    return chemin_historique + ".segments.json"
+
+
+def _date_de_ligne(ligne):
+    # Date/Heure est la 2e colonne du schéma courant
+    champs = ligne.split(",", 2)
+    return champs[1] if len(champs) >= 3 else None
+
+
+class ManifesteSegments:
+    """Liste des segments compressés d'un historique, avec la période couverte par chacun.
+
+    <historique>.segments.json : [{"fichier", "debut", "fin", "lignes", "octets"}, ...]
+    dans l'ordre chronologique. Une requête n'ouvre que les segments qui chevauchent sa période.
+    """
+
+    def __init__(self, chemin_historique):
+        self.chemin_historique = chemin_historique
+        self.chemin = fichier_manifeste(chemin_historique)
+        self.dossier = os.path.dirname(os.path.abspath(chemin_historique))
+        self.segments = []
+
+    def charger(self):
+        try:
+            with open(self.chemin, "r", encoding="utf-8") as fichier:
+                self.segments = json.load(fichier).get("segments", [])
+        except (OSError, ValueError):
+            self.segments = []
+        return self
+
+    def enregistrer(self):
+        ecrire_fichier_atomique(
+            self.chemin, lambda fichier: json.dump({"segments": self.segments}, fichier, ensure_ascii=False, indent=1)
+        )
+
+    def chemin_segment(self, segment):
+        return os.path.join(self.dossier, segment["fichier"])
+
+    def segments_entre(self, debut=None, fin=None):
+        """Segments dont la période chevauche [debut, fin] (bornes optionnelles, incluses)."""
+        return [
+            segment for segment in self.segments
+            if (debut is None or segment["fin"] >= debut) and (fin is None or segment["debut"] <= fin)
+        ]
+
+
+class RotationHistorique:
+    """Rotation quotidienne ou par taille de l'historique, compression gzip et rétention.
+
+    Appelée par le thread d'écriture de JournalRFID (seul écrivain) entre deux lignes.
+    Le segment fermé est compressé et ajouté au manifeste avant que le fichier courant
+    soit remplacé : un lecteur peut voir un instant une ligne en double, jamais en perdre.
+    """
+
+    def __init__(self, chemin_historique, mode=ROTATION_QUOTIDIENNE, taille_max=5 * 1024 * 1024,
+                 retention_jours=365, retention_segments=None):
+        if mode not in (ROTATION_QUOTIDIENNE, ROTATION_TAILLE):
+            raise ValueError(f"Mode de rotation inconnu : {mode}")
+        self.chemin_historique = chemin_historique
+        self.mode = mode
+        self.taille_max = taille_max
+        self.retention_jours = retention_jours
+        self.retention_segments = retention_segments
+        self.manifeste = ManifesteSegments(chemin_historique).charger()
+        self._premiere_date = self._lire_premiere_date()
+
+    def _lire_premiere_date(self):
+        try:
+            with open(self.chemin_historique, "r", newline="", encoding="utf-8") as fichier:
+                fichier.readline()
+                return _date_de_ligne(fichier.readline())
+        except OSError:
+            return None
+
+    def noter_ligne(self, date_heure):
+        if self._premiere_date is None:
+            self._premiere_date = date_heure
+
+    def doit_tourner(self, date_heure):
+        """True si la ligne datée `date_heure` doit ouvrir un nouveau segment."""
+        if self._premiere_date is None:
+            return False
+        if self.mode == ROTATION_QUOTIDIENNE:
+            return date_heure[:10] != self._premiere_date[:10]
+        try:
+            return os.path.getsize(self.chemin_historique) >= self.taille_max
+        except OSError:
+            return False
+
+    def _nom_segment(self):
+        base, extension = os.path.splitext(os.path.basename(self.chemin_historique))
+        horodatage = self._premiere_date.replace("-", "").replace(":", "").replace(" ", "-")
+        nom = f"{base}.{horodatage}{extension}.gz"
+        numero = 1
+        while os.path.exists(os.path.join(self.manifeste.dossier, nom)):
+            numero += 1
+            nom = f"{base}.{horodatage}-{numero}{extension}.gz"
+        return nom
+
+    def tourner(self):
+        """Ferme le fichier courant en segment compressé et repart d'un fichier vide."""
+        if self._premiere_date is None:
+            return None
+        nom = self._nom_segment()
+        chemin_segment = os.path.join(self.manifeste.dossier, nom)
+        lignes = 0
+        derniere_date = self._premiere_date
+
+        with open(self.chemin_historique, "r", newline="", encoding="utf-8") as source:
+            def compresser(destination):
+                nonlocal lignes, derniere_date
+                with gzip.GzipFile(filename=nom[:-3], mode="wb", fileobj=destination) as flux:
+                    for ligne in source:
+                        flux.write(ligne.encode("utf-8"))
+                        date = _date_de_ligne(ligne)
+                        if date and date != COLONNES_EVENEMENT[1]:
+                            lignes += 1
+                            derniere_date = date
+
+            ecrire_fichier_atomique(chemin_segment, compresser, binaire=True)
+
+        segment = {
+            "fichier": nom,
+            "debut": self._premiere_date,
+            "fin": derniere_date,
+            "lignes": lignes,
+            "octets": os.path.getsize(chemin_segment),
+        }
+        self.manifeste.segments.append(segment)
+        self.manifeste.enregistrer()
+
+        def en_tete(fichier):
+            csv.writer(fichier).writerow(COLONNES_EVENEMENT)
+
+        ecrire_fichier_atomique(self.chemin_historique, en_tete)
+        self._premiere_date = None
+        print(f"[HISTORIQUE] Segment {nom} fermé ({lignes} ligne(s), {segment['octets']} octets).")
+        self.appliquer_retention()
+        return segment
+
+    def appliquer_retention(self, maintenant=None):
+        """Supprime les segments trop anciens ou en surnombre ; retourne les segments supprimés."""
+        maintenant = maintenant or datetime.now()
+        a_supprimer = []
+        if self.retention_jours is not None:
+            limite = (maintenant - timedelta(days=self.retention_jours)).strftime("%Y-%m-%d %H:%M:%S")
+            a_supprimer = [segment for segment in self.manifeste.segments if segment["fin"] < limite]
+        if self.retention_segments is not None:
+            restants = [segment for segment in self.manifeste.segments if segment not in a_supprimer]
+            if len(restants) > self.retention_segments:
+                a_supprimer += restants[:len(restants) - self.retention_segments]
+        if not a_supprimer:
+            return []
+
+        # Le manifeste d'abord : un segment encore listé existe toujours sur le disque
+        self.manifeste.segments = [segment for segment in self.manifeste.segments if segment not in a_supprimer]
+        self.manifeste.enregistrer()
+        for segment in a_supprimer:
+            try:
+                os.remove(self.manifeste.chemin_segment(segment))
+            except OSError as e:
+                print(f"[ERREUR] Suppression du segment {segment['fichier']} : {e}")
+        print(f"[HISTORIQUE] Rétention : {len(a_supprimer)} segment(s) supprimé(s).")
+        return a_supprimer
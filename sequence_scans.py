@@ -0,0 +1,38 @@
+import json
+import threading
+
+from ecriture_atomique import ecrire_fichier_atomique
+
+
+class SequenceScans:
+    """Numéro de séquence des scans d'un lecteur, strictement croissant même après un redémarrage.
+
+    Avec l'identifiant du lecteur, il forme la clé (lecteur, sequence) qui permet au
+    consommateur MQTT d'écarter les doublons. Le fichier ne garde qu'une borne réservée par
+    blocs de `bloc` numéros : une écriture disque tous les `bloc` scans, et un redémarrage
+    saute au plus `bloc` numéros sans jamais en réutiliser un.
+    """
+
+    def __init__(self, nom_fichier="sequence_scans.json", bloc=1000):
+        self.nom_fichier = nom_fichier
+        self.bloc = bloc
+        self._verrou = threading.Lock()
+        self._suivant = self._lire_reserve()
+        self._reserve = self._suivant
+
+    def _lire_reserve(self):
+        try:
+            with open(self.nom_fichier, "r", encoding="utf-8") as fichier:
+                return max(1, int(json.load(fichier).get("reserve", 1)))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return 1
+
+    def suivant(self):
+        with self._verrou:
+            if self._suivant >= self._reserve:
+                self._reserve = self._suivant + self.bloc
+                reserve = self._reserve
+                ecrire_fichier_atomique(self.nom_fichier, lambda fichier: json.dump({"reserve": reserve}, fichier))
+            numero = self._suivant
+            self._suivant += 1
+            return numero
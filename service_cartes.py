@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from balayeur_expiration import BalayeurExpiration
+from cartes_autorisees import GestionCartesCSV, afficher_table_cartes, ecrire_cartes_exportees
+from decision_acces import ResultatVerification
+
+CHEMIN_SOCKET = "/tmp/cartes_rfid.sock"
+
+# Méthodes de la table des cartes exposées aux lecteurs
+METHODES_AUTORISEES = {
+    "evaluer_carte",
+    "verifier_carte",
+    "ajouter_ou_modifier_carte",
+    "mettre_a_jour_credits",
+    "decrementer_un_credit",
+    "supprimer_carte",
+    "importer_cartes",
+    "exporter_cartes",
+    "desactiver_cartes_expirees",
+}
+
+
+class _GestionnaireConnexion(socketserver.BaseRequestHandler):
+    """Une connexion lecteur : une requête JSON par ligne, réponses dans le même ordre.
+
+    Le client peut envoyer plusieurs requêtes d'affilée sans attendre (pipelining) :
+    toutes les lignes complètes reçues sont traitées et leurs réponses partent en un seul envoi.
+    """
+
+    def handle(self):
+        service = self.server.service
+        if not service._enregistrer_connexion(self.request):
+            return
+        try:
+            self._servir()
+        except OSError:
+            # Connexion fermée par arreter() ou par le client pendant un échange
+            pass
+        finally:
+            service._retirer_connexion(self.request)
+
+    def _servir(self):
+        tampon = b""
+        while True:
+            donnees = self.request.recv(65536)
+            if not donnees:
+                break
+            tampon += donnees
+            *lignes, tampon = tampon.split(b"\n")
+            reponses = [
+                json.dumps(self.server.service.traiter(ligne), default=str).encode("utf-8") + b"\n"
+                for ligne in lignes if ligne.strip()
+            ]
+            if reponses:
+                self.request.sendall(b"".join(reponses))
+
+
+class _ServeurUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ServiceCartes:
+    """Service local propriétaire de la table des cartes, partagé par plusieurs lecteurs.
+
+    Chaque connexion a son thread. Aucun verrou global ici : le backend se protège lui-même
+    (RLock de GestionCartesCSV, verrou de GestionCartesSQLite). Une lecture dans l'index en
+    mémoire n'attend donc pas la sauvegarde durable d'un autre lecteur, et les écritures
+    concurrentes peuvent être regroupées par le commit groupé du backend.
+    """
+
+    def __init__(self, gestion_cartes, chemin_socket=CHEMIN_SOCKET):
+        self.gestion_cartes = gestion_cartes
+        self.chemin_socket = chemin_socket
+        self._serveur = None
+        # Connexions lecteurs ouvertes -> thread qui les sert, fermées et attendues par arreter()
+        self._connexions = {}
+        self._verrou_connexions = threading.Lock()
+        self._arrete = False
+
+    def _enregistrer_connexion(self, connexion):
+        with self._verrou_connexions:
+            if self._arrete:
+                return False
+            self._connexions[connexion] = threading.current_thread()
+            return True
+
+    def _retirer_connexion(self, connexion):
+        with self._verrou_connexions:
+            self._connexions.pop(connexion, None)
+
+    def traiter(self, ligne):
+        try:
+            requete = json.loads(ligne)
+        except ValueError:
+            return {"id": None, "ok": False, "erreur": "Requête JSON invalide"}
+
+        identifiant = requete.get("id")
+        methode = requete.get("methode")
+        if methode not in METHODES_AUTORISEES:
+            return {"id": identifiant, "ok": False, "erreur": f"Méthode inconnue : {methode}"}
+
+        try:
+            resultat = getattr(self.gestion_cartes, methode)(*requete.get("args", []))
+        except Exception as e:
+            return {"id": identifiant, "ok": False, "erreur": str(e)}
+
+        if isinstance(resultat, ResultatVerification):
+            resultat = resultat.vers_dict()
+        return {"id": identifiant, "ok": True, "resultat": resultat}
+
+    def demarrer(self):
+        self._arrete = False
+        if os.path.exists(self.chemin_socket):
+            os.remove(self.chemin_socket)
+        self._serveur = _ServeurUnix(self.chemin_socket, _GestionnaireConnexion)
+        self._serveur.service = self
+        os.chmod(self.chemin_socket, 0o660)
+        print(f"[SERVICE] Table des cartes servie sur {self.chemin_socket}")
+        self._serveur.serve_forever()
+
+    def arreter(self):
+        """Ferme l'écoute puis les connexions ouvertes et attend leurs threads : aucune requête
+        n'est plus en cours quand l'appelant ferme ensuite le backend."""
+        if self._serveur is not None:
+            self._serveur.shutdown()
+            self._serveur.server_close()
+            self._serveur = None
+        with self._verrou_connexions:
+            self._arrete = True
+            connexions = list(self._connexions.items())
+        for connexion, _ in connexions:
+            try:
+                connexion.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for connexion, thread in connexions:
+            thread.join(timeout=2)
+            connexion.close()
+        if os.path.exists(self.chemin_socket):
+            os.remove(self.chemin_socket)
+
+
+class ErreurServiceCartes(Exception):
+    pass
+
+
+class ClientServiceCartes:
+    """Client du ServiceCartes avec la même interface que GestionCartesCSV."""
+
+    def __init__(self, chemin_socket=CHEMIN_SOCKET, delai_max=5.0):
+        self.chemin_socket = chemin_socket
+        self.delai_max = delai_max
+        self.colonnes = ["UID", "Nom", "Actif", "Credits", "Id", "Expiration", "Debut", "Fin", "Jours"]
+        self._verrou = threading.Lock()
+        self._socket = None
+        self._lecteur = None
+        self._prochain_id = 0
+
+    def _connecter(self):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(self.delai_max)
+        self._socket.connect(self.chemin_socket)
+        self._lecteur = self._socket.makefile("rb")
+
+    def _fermer_socket(self):
+        if self._lecteur is not None:
+            self._lecteur.close()
+        if self._socket is not None:
+            self._socket.close()
+        self._socket = None
+        self._lecteur = None
+
+    def _echanger(self, appels):
+        requetes = []
+        for methode, args in appels:
+            self._prochain_id += 1
+            requetes.append({"id": self._prochain_id, "methode": methode, "args": list(args)})
+
+        # Toutes les requêtes partent en un seul envoi, puis on lit les réponses dans l'ordre
+        # default=str : les UidCarte partent sous leur forme texte
+        paquet = b"".join(json.dumps(requete, default=str).encode("utf-8") + b"\n" for requete in requetes)
+        if self._socket is None:
+            self._connecter()
+            self._socket.sendall(paquet)
+        else:
+            try:
+                self._socket.sendall(paquet)
+            except OSError:
+                # Service redémarré depuis le dernier appel : rien n'a été traité, on renvoie
+                self._fermer_socket()
+                self._connecter()
+                self._socket.sendall(paquet)
+
+        reponses = []
+        for requete in requetes:
+            ligne = self._lecteur.readline()
+            if not ligne:
+                raise ConnectionError("Connexion fermée par le service des cartes")
+            reponse = json.loads(ligne)
+            if reponse.get("id") != requete["id"]:
+                raise ConnectionError("Réponse désynchronisée du service des cartes")
+            reponses.append(reponse)
+        return reponses
+
+    def pipeline(self, appels):
+        """Envoie plusieurs appels [(methode, args), ...] d'un coup et retourne leurs résultats."""
+        appels = list(appels)
+        with self._verrou:
+            try:
+                reponses = self._echanger(appels)
+            except (OSError, ValueError):
+                # Pas de nouvel essai ici : les requêtes ont pu être appliquées
+                self._fermer_socket()
+                raise
+
+        resultats = []
+        for reponse in reponses:
+            if not reponse.get("ok"):
+                raise ErreurServiceCartes(reponse.get("erreur"))
+            resultats.append(reponse.get("resultat"))
+        return resultats
+
+    def _appeler(self, methode, *args):
+        return self.pipeline([(methode, args)])[0]
+
+    def evaluer_carte(self, uid_recherche):
+        return ResultatVerification.depuis_dict(self._appeler("evaluer_carte", uid_recherche))
+
+    def verifier_carte(self, uid_recherche):
+        return tuple(self._appeler("verifier_carte", uid_recherche))
+
+    def ajouter_ou_modifier_carte(self, uid, nom, actif, credits, expiration="", debut="", fin="", jours=""):
+        return tuple(self._appeler("ajouter_ou_modifier_carte", uid, nom, actif, credits,
+                                   expiration, debut, fin, jours))
+
+    def mettre_a_jour_credits(self, uid, nouveaux_credits):
+        return self._appeler("mettre_a_jour_credits", uid, nouveaux_credits)
+
+    def decrementer_un_credit(self, uid):
+        return self._appeler("decrementer_un_credit", uid)
+
+    def supprimer_carte(self, uid):
+        return self._appeler("supprimer_carte", uid)
+
+    def importer_cartes(self, cartes):
+        nombre, erreurs = self._appeler("importer_cartes", list(cartes))
+        return nombre, [tuple(erreur) for erreur in erreurs]
+
+    def exporter_cartes(self, chemin=None):
+        lignes = self._appeler("exporter_cartes")
+        if chemin:
+            ecrire_cartes_exportees(lignes, chemin, self.colonnes)
+        return lignes
+
+    def desactiver_cartes_expirees(self):
+        return self._appeler("desactiver_cartes_expirees")
+
+    def afficher_toutes_les_cartes(self):
+        afficher_table_cartes(self.exporter_cartes())
+
+    def fermer(self):
+        with self._verrou:
+            self._fermer_socket()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service local de la table des cartes RFID")
+    parser.add_argument("--socket", default=CHEMIN_SOCKET, help="Chemin du socket Unix")
+    parser.add_argument("--base", default="cartes_autorisees.csv",
+                        help="Table des cartes (.csv, ou .db pour le backend SQLite)")
+    parser.add_argument("--intervalle-balayage", type=int, default=3600,
+                        help="Intervalle du balayage des cartes expirées (secondes)")
+    arguments = parser.parse_args()
+
+    if arguments.base.endswith(".db"):
+        from cartes_sqlite import GestionCartesSQLite
+        gestion = GestionCartesSQLite(nom_fichier=arguments.base)
+    else:
+        gestion = GestionCartesCSV(nom_fichier=arguments.base)
+
+    balayeur = BalayeurExpiration(gestion, intervalle=arguments.intervalle_balayage)
+    balayeur.demarrer()
+    service = ServiceCartes(gestion, chemin_socket=arguments.socket)
+    try:
+        service.demarrer()
+    except KeyboardInterrupt:
+        print("\n[SERVICE] Arret demande.")
+    finally:
+        service.arreter()
+        balayeur.arreter()
+        gestion.fermer()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+import time
+
+
+class SpoolMqtt:
+    """File d'attente MQTT persistante (SQLite) : chaque message y est ajouté avant l'envoi
+    et n'en est retiré qu'après l'accusé de réception du broker (PUBACK).
+
+    WAL + synchronous=NORMAL : un ajout ne coûte pas de fsync et survit à un arrêt du
+    processus ; seule une coupure de courant peut perdre les toutes dernières entrées.
+    """
+
+    def __init__(self, nom_fichier="mqtt_spool.db", taille_max=100000):
+        self.nom_fichier = nom_fichier
+        self.taille_max = taille_max
+        self._verrou = threading.Lock()
+        self._connexion = sqlite3.connect(nom_fichier, check_same_thread=False, isolation_level=None)
+        with self._verrou:
+            self._connexion.execute("PRAGMA journal_mode=WAL")
+            self._connexion.execute("PRAGMA synchronous=NORMAL")
+            self._connexion.execute(
+                """CREATE TABLE IF NOT EXISTS messages (
+                    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    Sujet TEXT NOT NULL,
+                    Charge BLOB NOT NULL,
+                    Cree REAL NOT NULL
+                )"""
+            )
+
+    def ajouter(self, sujet, charge):
+        if isinstance(charge, str):
+            charge = charge.encode("utf-8")
+        with self._verrou:
+            curseur = self._connexion.execute(
+                "INSERT INTO messages (Sujet, Charge, Cree) VALUES (?, ?, ?)", (sujet, charge, time.time())
+            )
+            identifiant = curseur.lastrowid
+            # Panne très longue : on garde les plus récents plutôt que de remplir la carte SD
+            if self.taille_max and identifiant % 1000 == 0:
+                self._connexion.execute(
+                    "DELETE FROM messages WHERE Id <= (SELECT MAX(Id) FROM messages) - ?", (self.taille_max,)
+                )
+            return identifiant
+
+    def suivants(self, apres_id=0, limite=10):
+        """Messages en attente d'Id > apres_id, du plus ancien au plus récent : [(id, sujet, charge, cree), ...]."""
+        with self._verrou:
+            return self._connexion.execute(
+                "SELECT Id, Sujet, Charge, Cree FROM messages WHERE Id > ? ORDER BY Id LIMIT ?", (apres_id, limite)
+            ).fetchall()
+
+    def supprimer(self, identifiants):
+        identifiants = list(identifiants)
+        if not identifiants:
+            return
+        with self._verrou:
+            self._connexion.executemany("DELETE FROM messages WHERE Id = ?", ((i,) for i in identifiants))
+
+    def taille(self):
+        with self._verrou:
+            return self._connexion.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def fermer(self):
+        with self._verrou:
+            self._connexion.close()
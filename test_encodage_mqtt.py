@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# Tests de l'encodage MQTT : valeurs hors bornes et messages non encodables.
+#
+#   python -m unittest test_encodage_mqtt
+
+import os
+import tempfile
+import unittest
+
+from encodage_mqtt import ENCODAGE_BINAIRE, EncodeurBinaire, decoder_charge
+from mqtt_publisher import MqttPublisher
+from spool_mqtt import SpoolMqtt
+
+MESSAGE = {
+    "date_heure": "2026-10-18 10:00:00",
+    "lecteur": "lecteur-1",
+    "uid": "211-183-212-9",
+    "type_carte": "MIFARE",
+    "nom": "Alice",
+    "statut": "Accepte",
+    "raison": "",
+    "credits_avant": 5,
+    "credits_apres": 4,
+    "latence_ms": 12.3,
+    "sequence": 42,
+    "type_acces": "autorise",
+}
+
+
+def aller_retour(message):
+    encodeur = EncodeurBinaire()
+    return decoder_charge(encodeur.assembler([encodeur.encoder(message)], lot=False))[0]
+
+
+class TestEncodeurBinaire(unittest.TestCase):
+    def test_aller_retour(self):
+        self.assertEqual(aller_retour(MESSAGE), MESSAGE)
+
+    def test_latence_negative_saturee(self):
+        decode = aller_retour(dict(MESSAGE, latence_ms=-3.5))
+        self.assertEqual(decode["latence_ms"], 0.0)
+        self.assertEqual(decode["sequence"], 42)
+
+    def test_latence_enorme_saturee(self):
+        self.assertEqual(aller_retour(dict(MESSAGE, latence_ms=1e9))["latence_ms"], 6553.4)
+
+    def test_date_hors_plage_saturee(self):
+        self.assertEqual(aller_retour(dict(MESSAGE, date_heure="1960-01-01 00:00:00"))["date_heure"],
+                         "1970-01-01 00:00:00")
+
+    def test_credits_non_numeriques(self):
+        decode = aller_retour(dict(MESSAGE, credits_avant="", credits_apres="abc"))
+        self.assertIsNone(decode["credits_avant"])
+        self.assertIsNone(decode["credits_apres"])
+
+
+class TestSpoolNonEncodable(unittest.TestCase):
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.spool = SpoolMqtt(os.path.join(self.dossier.name, "spool.db"))
+        # Publieur sans réseau : seule la préparation des lots est exercée
+        self.publieur = MqttPublisher(False, "", 0, "")
+        self.publieur.spool = self.spool
+        self.publieur.encodeur = EncodeurBinaire()
+        self.publieur.taille_lot = 10
+        self.publieur.delai_lot = 0.0
+        self.publieur.octets_max_lot = 32 * 1024
+        self.publieur._vidage = True
+
+    def tearDown(self):
+        self.spool.fermer()
+        self.dossier.cleanup()
+
+    def test_message_non_encodable_envoye_tel_quel_et_conserve(self):
+        self.spool.ajouter("s", b'{"sequence": 1, "latence_ms": -2}')
+        self.spool.ajouter("s", b"pas du json")
+        self.spool.ajouter("s", b'{"sequence": 3}')
+
+        (sujet, messages, brut), _, _ = self.publieur._preparer_lot(0)
+        self.assertEqual(([identifiant for identifiant, _ in messages], brut), ([1], False))
+
+        (sujet, messages, brut), declencheur, _ = self.publieur._preparer_lot(1)
+        self.assertEqual((messages, brut, declencheur), ([(2, b"pas du json")], True, "brut"))
+
+        (sujet, messages, brut), _, _ = self.publieur._preparer_lot(2)
+        self.assertEqual(([identifiant for identifiant, _ in messages], brut), ([3], False))
+        # Rien n'est retiré du spool avant le PUBACK
+        self.assertEqual(self.spool.taille(), 3)
+        self.assertEqual(self.publieur.encodeur.nom, ENCODAGE_BINAIRE)
+
+
+if __name__ == "__main__":
+    unittest.main()
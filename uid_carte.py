@@ -0,0 +1,83 @@
+class UidCarte:
+    """UID de carte immuable et hachable.
+
+    Stocké en bytes ; la forme texte "211-183-212-9-185" est calculée une seule fois.
+    Le hachage est celui de cette forme texte, donc un UidCarte retrouve directement
+    les entrées des dict indexés par chaîne (index des cartes, pass.json, ...).
+    Il se comporte aussi comme une séquence d'octets pour le lecteur (list[int]), mais n'est
+    égal qu'à un autre UidCarte ou à sa forme texte.
+    """
+
+    __slots__ = ("octets", "texte", "_hash")
+
+    def __init__(self, octets):
+        octets = bytes(octets)
+        texte = "-".join(str(octet) for octet in octets)
+        object.__setattr__(self, "octets", octets)
+        object.__setattr__(self, "texte", texte)
+        object.__setattr__(self, "_hash", hash(texte))
+
+    def __setattr__(self, nom, valeur):
+        raise AttributeError("UidCarte est immuable")
+
+    @classmethod
+    def depuis_texte(cls, texte):
+        return cls(int(octet) for octet in texte.strip().split("-"))
+
+    def __str__(self):
+        return self.texte
+
+    def __repr__(self):
+        return f"UidCarte('{self.texte}')"
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, autre):
+        if isinstance(autre, UidCarte):
+            return self.octets == autre.octets
+        if isinstance(autre, str):
+            return self.texte == autre
+        # Seulement les formes dont le hachage est celui du texte (a == b => hash(a) == hash(b)) :
+        # bytes et list[int] passent d'abord par normaliser_uid
+        return NotImplemented
+
+    def __ne__(self, autre):
+        egal = self.__eq__(autre)
+        return egal if egal is NotImplemented else not egal
+
+    def __iter__(self):
+        return iter(self.octets)
+
+    def __len__(self):
+        return len(self.octets)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            # Même type qu'un UID brut du lecteur (list[int])
+            return list(self.octets[position])
+        return self.octets[position]
+
+    def __reduce__(self):
+        return (UidCarte, (self.octets,))
+
+
+# Le lecteur renvoie sans cesse les mêmes cartes : on réutilise les instances déjà créées
+_INTERNEES = {}
+_TAILLE_MAX_INTERNEES = 4096
+
+
+def normaliser_uid(valeur):
+    """Retourne le UidCarte d'une valeur : UidCarte, list[int] du lecteur, bytes ou texte "1-2-3"."""
+    if isinstance(valeur, UidCarte):
+        return valeur
+    if isinstance(valeur, str):
+        return UidCarte.depuis_texte(valeur)
+
+    octets = bytes(valeur)
+    uid = _INTERNEES.get(octets)
+    if uid is None:
+        if len(_INTERNEES) >= _TAILLE_MAX_INTERNEES:
+            _INTERNEES.clear()
+        uid = _INTERNEES[octets] = UidCarte(octets)
+    return uid
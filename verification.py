@@ -1,54 +1,29 @@
-import csv
-from datetime import datetime
-import os
+from cartes_autorisees import GestionCartesCSV
+from uid_carte import normaliser_uid
 
 FICHIER_CARTES = "cartes_autorisees.csv"
-FICHIER_HISTORIQUE = "historique_acces.csv"
 
-def enregistrer_historique(carte_id, nom, statut):
-    date_heure = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    fichier_existe = os.path.exists(FICHIER_HISTORIQUE)
-    
-    try:
-        with open(FICHIER_HISTORIQUE, "a", newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not fichier_existe:
-                writer.writerow(["UID", "Nom", "Date", "Statut"])
-            writer.writerow([carte_id, nom, date_heure, statut])
-    except Exception as e:
-        print(f"Erreur écriture historique: {e}")
+_gestion_cartes = None
 
-def identifier_carte(uid):
-    carte_id = "-".join(str(o) for o in uid)
-    nom_trouve = "Inconnu"
-    est_actif = False
-    carte_existe = False
 
-    if os.path.exists(FICHIER_CARTES):
-        try:
-            with open(FICHIER_CARTES, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row["UID"] == carte_id:
-                        carte_existe = True
-                        nom_trouve = row["Nom"]
-                        est_actif = str(row["Actif"]).strip().lower() == "true"
-                        break
-        except Exception as e:
-            print(f"Erreur lors de la lecture du fichier cartes: {e}")
-    else:
-        print(f"[Attention] Le fichier {FICHIER_CARTES} n'existe pas encore.")
+def _obtenir_gestion_cartes():
+    global _gestion_cartes
+    if _gestion_cartes is None:
+        _gestion_cartes = GestionCartesCSV(nom_fichier=FICHIER_CARTES)
+    return _gestion_cartes
+
+
+def identifier_carte(uid):
+    # Délègue au moteur de décision unique (GestionCartesCSV.evaluer_carte).
+    # Le journal est écrit par RFIDController, plus de ligne en double ici.
+    carte_id = normaliser_uid(uid)
+    decision = _obtenir_gestion_cartes().evaluer_carte(carte_id)
 
-    if carte_existe:
-        if est_actif:
-            print(f"Bienvenue {nom_trouve}")
-            enregistrer_historique(carte_id, nom_trouve, "accepte")
-            return True, nom_trouve
-        else:
-            print(f"Accès refusé  Carte désactivée pour {nom_trouve}")
-            enregistrer_historique(carte_id, nom_trouve, "refuse (desactivee)")
-            return False, nom_trouve
-    else:
-        print("Acces refuse  Carte inconnue")
-        enregistrer_historique(carte_id, "Inconnu", "refuse")
-        return False, "Inconnu"
\ No newline at end of file
+    if decision.autorise:
+        print(f"Bienvenue {decision.nom}")
+        return True, decision.nom
+    if decision.carte_connue:
+        print(f"Accès refusé  {decision.raison} pour {decision.nom}")
+        return False, decision.nom
+    print("Acces refuse  Carte inconnue")
+    return False, "Inconnu"